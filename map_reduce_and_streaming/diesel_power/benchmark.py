@@ -0,0 +1,136 @@
+"""
+Benchmark of every mapper, reducer and joiner on synthetic data, prints results as json:
+rows per second and peak memory allocated by the case (tracemalloc peak of a separate run,
+since tracing slows down allocations and RSS of the shared process barely grows after the first cases).
+Run from map_reduce_and_streaming directory:
+    python -m diesel_power.benchmark --rows 10000 100000 1000000 --output results.json
+Compare results.json of two runs to see regressions
+"""
+import argparse
+import dataclasses
+import json
+import platform
+import re
+import sys
+import time
+import tracemalloc
+import typing as tp
+
+from . import operations as ops
+
+TEXT = 'Hello, World! The quick brown fox, jumps over the LAZY dog.'
+GROUP_SIZE = 10
+
+
+def text_rows(n: int) -> ops.TRowsGenerator:
+    for i in range(n):
+        yield {'doc_id': i // GROUP_SIZE, 'text': TEXT, 'a': i, 'b': 0.5}
+
+
+def grouped_rows(n: int) -> ops.TRowsGenerator:
+    """Rows sorted by key, GROUP_SIZE rows per key"""
+    for i in range(n):
+        yield {'key': i // GROUP_SIZE, 'word': f'w{i % 7}', 'value': i}
+
+
+def join_rows(n: int, step: int) -> ops.TRowsGenerator:
+    """Rows sorted by key, every `step`-th key is present, so only part of keys match in the other table"""
+    for i in range(n):
+        yield {'key': i // GROUP_SIZE * step, 'value': i}
+
+
+@dataclasses.dataclass
+class Case:
+    name: str
+    run: tp.Callable[[int], ops.TRowsIterable]
+
+
+def map_case(mapper: ops.Mapper) -> Case:
+    return Case(f'Map({type(mapper).__name__})', lambda n: ops.Map(mapper)(text_rows(n)))
+
+
+def reduce_case(reducer: ops.Reducer) -> Case:
+    return Case(f'Reduce({type(reducer).__name__})', lambda n: ops.Reduce(reducer, ('key',))(grouped_rows(n)))
+
+
+def join_case(joiner: ops.Joiner) -> Case:
+    # Every key of the left table is twice as large as in the right one, so a half of keys of both tables match
+    return Case(f'Join({type(joiner).__name__})',
+                lambda n: ops.Join(joiner, ('key',))(join_rows(n, step=2), join_rows(n, step=1)))
+
+
+CASES = [
+    map_case(ops.DummyMapper()),
+    map_case(ops.FilterPunctuation('text')),
+    map_case(ops.LowerCase('text')),
+    map_case(ops.Split('text')),
+    map_case(ops.Product(('a', 'b'))),
+    map_case(ops.Filter(lambda row: row['a'] % 2 == 0)),
+    map_case(ops.Project(('doc_id', 'text'))),
+    reduce_case(ops.FirstReducer()),
+    reduce_case(ops.TopN('value', 3)),
+    reduce_case(ops.TermFrequency('word')),
+    reduce_case(ops.Count('count')),
+    reduce_case(ops.Sum('value')),
+    join_case(ops.InnerJoiner()),
+    join_case(ops.OuterJoiner()),
+    join_case(ops.LeftJoiner()),
+    join_case(ops.RightJoiner()),
+]
+
+
+def peak_memory(case: Case, rows: int) -> int:
+    """Peak size of memory blocks allocated by the case and not freed yet, in bytes"""
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        for _ in case.run(rows):
+            pass
+        return tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+
+def measure(case: Case, rows: int) -> dict[str, tp.Any]:
+    start = time.perf_counter()
+    rows_out = sum(1 for _ in case.run(rows))
+    seconds = time.perf_counter() - start
+    return {
+        'operation': case.name,
+        'rows': rows,
+        'rows_out': rows_out,
+        'seconds': seconds,
+        'rows_per_sec': rows / seconds if seconds > 0 else None,
+        'peak_memory': peak_memory(case, rows),
+    }
+
+
+def main(argv: tp.Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10 ** 4, 10 ** 5, 10 ** 6],
+                        help='numbers of input rows, from 1e4 to 1e7 are reasonable')
+    parser.add_argument('--filter', default='', help='regex, benchmark only operations matching it')
+    parser.add_argument('--output', help='file to write json to, stdout by default')
+    args = parser.parse_args(argv)
+
+    results = []
+    for case in CASES:
+        if not re.search(args.filter, case.name):
+            continue
+        for rows in args.rows:
+            result = measure(case, rows)
+            print(f'{case.name:<30}{rows:>10} rows{result["rows_per_sec"] or 0:>14.0f} rows/sec'
+                  f'{result["peak_memory"] // 1024:>10} KiB', file=sys.stderr)
+            results.append(result)
+
+    report = json.dumps({'python': platform.python_version(), 'results': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Microbenchmark of text mappers, prints chars/sec before and after text fast paths.
+Run from map_reduce_and_streaming directory: python -m diesel_power.benchmark_text
+"""
+import random
+import re
+import string
+import time
+import typing as tp
+
+from . import operations as ops
+from . import text
+
+N_ROWS = 20000
+WORDS_PER_ROW = 50
+
+
+def legacy_filter_punctuation(txt: str) -> str:
+    return "".join(list(filter(lambda x: x not in string.punctuation, txt)))
+
+
+def legacy_itersplit(txt: str, sep: tp.Optional[str]) -> tp.Generator[str, None, None]:
+    sep = sep or r"\s+"
+    for match in re.finditer(r'\w+', txt):
+        yield match.group(0)
+
+
+def make_texts() -> list[str]:
+    random.seed(0)
+    words = [''.join(random.choices(string.ascii_letters, k=random.randint(1, 10))) for _ in range(1000)]
+    return [' '.join(random.choice(words) + random.choice(',.!? ') for _ in range(WORDS_PER_ROW))
+            for _ in range(N_ROWS)]
+
+
+def measure(name: str, texts: list[str], func: tp.Callable[[list[str]], tp.Any]) -> None:
+    chars = sum(map(len, texts))
+    start = time.perf_counter()
+    func(texts)
+    elapsed = time.perf_counter() - start
+    print(f'{name:<40}{chars / elapsed / 1e6:>10.2f} M chars/sec')
+
+
+if __name__ == "__main__":
+    texts = make_texts()
+
+    measure('FilterPunctuation before', texts, lambda ts: [legacy_filter_punctuation(t) for t in ts])
+    measure('FilterPunctuation after', texts, lambda ts: [text.remove_punctuation(t) for t in ts])
+
+    measure('Split before', texts, lambda ts: [list(legacy_itersplit(t, None)) for t in ts])
+    measure('Split after', texts, lambda ts: [list(text.itersplit(t, None)) for t in ts])
+    measure('Split batched', texts, lambda ts: text.split_many(ts))
+
+    rows = [{'text': t} for t in texts]
+    measure('Map(Split) rows', texts, lambda ts: sum(1 for _ in ops.Map(ops.Split('text'))(rows)))
+    measure('BatchSplit rows', texts, lambda ts: sum(1 for _ in ops.BatchSplit('text')(rows)))
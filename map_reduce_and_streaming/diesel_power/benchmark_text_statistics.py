@@ -0,0 +1,96 @@
+"""
+Benchmark of tf-idf on synthetic corpus, prints words/sec of the reduce/join graph and of TfIdf operation.
+Run from map_reduce_and_streaming directory: python -m diesel_power.benchmark_text_statistics
+"""
+import math
+import random
+import time
+import typing as tp
+from collections import defaultdict
+
+from . import operations as ops
+from .graph import Graph
+
+N_DOCS = 20000
+WORDS_PER_DOC = 100
+VOCABULARY = 20000
+
+
+class LegacyTermFrequency(ops.Reducer):
+    """TermFrequency counting words one by one in defaultdict"""
+    def __init__(self, words_column: str, result_column: str = 'tf') -> None:
+        self.words_column = words_column
+        self.result_column = result_column
+
+    def __call__(self, group_key: tuple[str, ...], rows: ops.TRowsIterable) -> ops.TRowsGenerator:
+        cnt: defaultdict[str, int] = defaultdict(int)
+        last: ops.TRow = dict()
+        for row in rows:
+            cnt[row[self.words_column]] += 1
+            last = row
+        tmp = {col: val for col, val in last.items() if col in group_key}
+        words = sum(cnt.values())
+        for col, val in cnt.items():
+            row = tmp.copy()
+            row[self.words_column] = col
+            row[self.result_column] = val / words
+            yield row
+
+
+class FirstRow(ops.Reducer):
+    def __call__(self, group_key: tuple[str, ...], rows: ops.TRowsIterable) -> ops.TRowsGenerator:
+        yield next(iter(rows))
+
+
+class IdfMapper(ops.Mapper):
+    def __init__(self, docs: int) -> None:
+        self.docs = docs
+
+    def __call__(self, row: ops.TRow) -> ops.TRowsGenerator:
+        yield {'text': row['text'], 'idf': math.log(self.docs / row['df'])}
+
+
+class TfIdfMapper(ops.Mapper):
+    def __call__(self, row: ops.TRow) -> ops.TRowsGenerator:
+        yield {'doc_id': row['doc_id'], 'text': row['text'], 'tf_idf': row['tf'] * row['idf']}
+
+
+def make_words() -> list[ops.TRow]:
+    random.seed(0)
+    # Zipf-like distribution of words
+    weights = [1 / rank for rank in range(1, VOCABULARY + 1)]
+    words = random.choices([f'w{i}' for i in range(VOCABULARY)], weights, k=N_DOCS * WORDS_PER_DOC)
+    return [{'doc_id': i // WORDS_PER_DOC, 'text': word} for i, word in enumerate(words)]
+
+
+def graph_tf_idf(term_frequency: ops.Reducer) -> Graph:
+    words = Graph.graph_from_iter('words')
+    tf = words.reduce(term_frequency, ('doc_id',)).sort(('text',))
+    idf = words.sort(('text', 'doc_id')) \
+        .reduce(FirstRow(), ('text', 'doc_id')) \
+        .reduce(ops.Count('df'), ('text',)) \
+        .map(IdfMapper(N_DOCS))
+    return tf.join(ops.InnerJoiner(), idf, ('text',)).map(TfIdfMapper())
+
+
+def measure(name: str, words: int, func: tp.Callable[[], tp.Any]) -> None:
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f'{name:<40}{words / elapsed / 1e6:>10.2f} M words/sec')
+
+
+if __name__ == "__main__":
+    data = make_words()
+
+    measure('Reduce(TermFrequency) before', len(data),
+            lambda: sum(1 for _ in ops.Reduce(LegacyTermFrequency('text'), ('doc_id',))(data)))
+    measure('Reduce(TermFrequency) after', len(data),
+            lambda: sum(1 for _ in ops.Reduce(ops.TermFrequency('text'), ('doc_id',))(data)))
+
+    measure('tf-idf graph before', len(data),
+            lambda: sum(1 for _ in graph_tf_idf(LegacyTermFrequency('text')).run(words=lambda: iter(data))))
+    measure('tf-idf graph after', len(data),
+            lambda: sum(1 for _ in graph_tf_idf(ops.TermFrequency('text')).run(words=lambda: iter(data))))
+    measure('TfIdf', len(data), lambda: sum(1 for _ in ops.TfIdf('doc_id', 'text')(data)))
+    measure('Pmi', len(data), lambda: sum(1 for _ in ops.Pmi('doc_id', 'text')(data)))
@@ -0,0 +1,47 @@
+import math
+import typing as tp
+
+
+class BloomFilter:
+    """
+    Compact probabilistic set: `item in bloom_filter` is always true for added items
+    and is true for other ones with probability about `false_positive_rate`.
+    Items are hashed with builtin hash, so filter must not be shared between processes with different hash seeds
+    """
+    def __init__(self, capacity: int, false_positive_rate: float = 0.01) -> None:
+        """
+        :param capacity: expected number of items, false positive rate grows if more items are added
+        :param false_positive_rate: desired probability of false positives, between 0 and 1
+        """
+        if not 0 < false_positive_rate < 1:
+            raise ValueError(f'False positive rate must be between 0 and 1, got {false_positive_rate}')
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _hash(self, item: tp.Hashable) -> tuple[int, int]:
+        # Double hashing: i-th position is h1 + i * h2, hash of a tuple mixes bits of small ints well
+        h = hash((item, self.size))
+        return h & 0xFFFFFFFF, (h >> 32) & 0xFFFFFFFF | 1
+
+    def add(self, item: tp.Hashable) -> None:
+        pos, step = self._hash(item)
+        for _ in range(self.hashes):
+            bit = pos % self.size
+            self._bits[bit >> 3] |= 1 << (bit & 7)
+            pos += step
+
+    def __contains__(self, item: tp.Hashable) -> bool:
+        pos, step = self._hash(item)
+        size, bits = self.size, self._bits
+        for _ in range(self.hashes):
+            bit = pos % size
+            if not bits[bit >> 3] & (1 << (bit & 7)):
+                return False
+            pos += step
+        return True
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
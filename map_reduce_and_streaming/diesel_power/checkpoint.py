@@ -0,0 +1,177 @@
+import functools
+import hashlib
+import os
+import re
+import sys
+import types
+import typing as tp
+
+from . import operations as ops
+from .graph import Graph
+
+SOURCES = (ops.Read, ops.ReadMmap, ops.ReadBinary, ops.ReadIterFactory)
+
+
+def describe(obj: tp.Any) -> str:
+    """
+    Stable description of operation config: its type and attributes, recursively.
+    Functions are described by their code, closure, defaults and values of globals they use,
+    so editing a lambda or a global constant it reads changes the description.
+    A reference back to an object being described is described by its depth, e.g. a recursive closure
+    :raises TypeError: if config contains an object which can't be described stably, e.g. it has no attributes
+    and its repr may contain a memory address
+    """
+    return _describe(obj, [])
+
+
+def _describe(obj: tp.Any, path: list[int]) -> str:
+    """
+    :param path: ids of the objects being described, from the outermost one
+    """
+    if obj is None or isinstance(obj, (str, bytes, int, float, bool)):
+        return repr(obj)
+    if isinstance(obj, (type, types.BuiltinFunctionType)) or _is_stdlib_function(obj):
+        return f'{obj.__module__}.{obj.__qualname__}'
+    if isinstance(obj, (types.MethodDescriptorType, types.WrapperDescriptorType)):
+        return f'{obj.__objclass__.__module__}.{obj.__qualname__}'
+    if isinstance(obj, types.ModuleType):
+        return f'module({obj.__name__})'
+    if id(obj) in path:
+        return f'cycle({path.index(id(obj))})'
+
+    path.append(id(obj))
+    try:
+        return _describe_object(obj, path)
+    finally:
+        path.pop()
+
+
+def _is_stdlib_function(obj: tp.Any) -> bool:
+    """Functions of standard library, e.g. json.loads, are the same in all runs, unlike their globals"""
+    return isinstance(obj, types.FunctionType) and obj.__module__.partition('.')[0] in sys.stdlib_module_names
+
+
+def _names(code: types.CodeType) -> set[str]:
+    """Global and attribute names used by code and code nested into it, e.g. of comprehensions"""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _names(const)
+    return names
+
+
+def _describe_object(obj: tp.Any, path: list[int]) -> str:
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        items = [_describe(item, path) for item in obj]
+        return f'{type(obj).__name__}({", ".join(sorted(items) if isinstance(obj, (set, frozenset)) else items)})'
+    if isinstance(obj, dict):
+        return '{' + ', '.join(sorted(f'{_describe(key, path)}: {_describe(val, path)}'
+                                      for key, val in obj.items())) + '}'
+    if isinstance(obj, types.CodeType):
+        return f'code({obj.co_code.hex()}, {_describe(obj.co_consts, path)}, {_describe(obj.co_names, path)})'
+    if isinstance(obj, types.FunctionType):
+        closure = [cell.cell_contents for cell in obj.__closure__ or ()]
+        used_globals = {name: obj.__globals__[name] for name in _names(obj.__code__) if name in obj.__globals__}
+        config = [obj.__code__, closure, obj.__defaults__, obj.__kwdefaults__, used_globals]
+        return f'{obj.__module__}.{obj.__qualname__}({", ".join(_describe(item, path) for item in config)})'
+    if isinstance(obj, types.MethodType):
+        return f'method({_describe(obj.__func__, path)}, {_describe(obj.__self__, path)})'
+    if isinstance(obj, functools.partial):
+        return f'partial({_describe(obj.func, path)}, {_describe(obj.args, path)}, {_describe(obj.keywords, path)})'
+    if isinstance(obj, re.Pattern):
+        return f're({obj.pattern!r}, {obj.flags})'
+    if hasattr(obj, '__dict__'):
+        return f'{type(obj).__module__}.{type(obj).__qualname__}({_describe(vars(obj), path)})'
+    raise TypeError(f'Can\'t describe object of type {type(obj).__qualname__!r} stably')
+
+
+class _CheckpointedOperation(ops.Operation):
+    """
+    Read output of the operation from checkpoint file if it exists, otherwise run the operation
+    and save its output. Checkpoint file appears only when the output is read till the end
+    """
+    def __init__(self, operation: ops.Operation, filename: str, checkpointer: 'Checkpointer') -> None:
+        self.operation = operation
+        self.filename = filename
+        self._checkpointer = checkpointer
+
+    def __call__(self, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        if os.path.exists(self.filename):
+            self._checkpointer.reused.append(self.filename)
+            yield from ops.ReadBinary(self.filename)()
+            return
+
+        # Every call writes its own temporary file, so stages read by several consumers may run concurrently
+        yield from ops.WriteBinary(self.filename)(self.operation(*args, **kwargs))
+        self._checkpointer.written.append(self.filename)
+
+
+class Checkpointer:
+    """
+    Runs graph saving output of every stage to cache directory.
+    A checkpoint is keyed by the hash of the stage config, configs of the stages it depends on
+    and modification times and sizes of the input files. On rerun, stages with checkpoints are read
+    from disk instead of being computed, so a failed job resumes from the last completed stages.
+    Stages depending on iterator sources (graph_from_iter) or having configs which can't be described
+    stably (see `describe`) are never checkpointed
+    """
+    def __init__(self, cache_dir: str) -> None:
+        """
+        :param cache_dir: directory for checkpoint files, created if doesn't exist
+        """
+        self.cache_dir = cache_dir
+        self.reused: list[str] = []
+        self.written: list[str] = []
+
+    @staticmethod
+    def _source_key(operation: ops.Operation) -> tp.Optional[str]:
+        if isinstance(operation, ops.ReadIterFactory):
+            return None
+        filename = tp.cast(tp.Union[ops.Read, ops.ReadMmap, ops.ReadBinary], operation).filename
+        stat = os.stat(filename)
+        try:
+            return f'{describe(operation)} {stat.st_mtime_ns} {stat.st_size}'
+        except TypeError:
+            return None
+
+    @staticmethod
+    def _stage_key(operation: ops.Operation, parent_keys: tuple[str, ...]) -> tp.Optional[str]:
+        try:
+            config = '\n'.join((describe(operation), *parent_keys))
+        except TypeError:
+            return None
+        return hashlib.sha256(config.encode()).hexdigest()
+
+    def instrument_graph(self, graph: Graph) -> Graph:
+        """Construct graph with every stage of the optimized `graph` checkpointed"""
+        keys: dict[int, tp.Optional[str]] = dict()
+        instrumented: dict[int, Graph] = dict()
+
+        def instrument(node: Graph) -> tuple[Graph, tp.Optional[str]]:
+            if id(node) not in instrumented:
+                parents, parent_keys = zip(*map(instrument, node.parents)) if node.parents else ((), ())
+                operation = node.operation
+                key: tp.Optional[str]
+                if isinstance(operation, SOURCES):
+                    key = self._source_key(operation)
+                elif None in parent_keys:
+                    key = None
+                else:
+                    key = self._stage_key(operation, tp.cast(tuple[str, ...], parent_keys))
+                    if key is not None:
+                        filename = os.path.join(self.cache_dir, f'{key}.bin')
+                        operation = _CheckpointedOperation(operation, filename, self)
+                keys[id(node)] = key
+                instrumented[id(node)] = Graph(operation, parents, node.sorted_by)
+            return instrumented[id(node)], keys[id(node)]
+
+        return instrument(graph.optimize())[0]
+
+    def run(self, graph: Graph, **kwargs: tp.Any) -> ops.TRowsIterable:
+        """
+        Run graph with checkpoints
+        :param graph: graph to run
+        :param kwargs: graph data sources
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        return self.instrument_graph(graph).run(**kwargs)
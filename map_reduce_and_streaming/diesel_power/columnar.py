@@ -0,0 +1,191 @@
+import functools
+import itertools
+import operator
+import typing as tp
+from abc import ABC, abstractmethod
+
+import numpy as np
+import numpy.typing as npt
+
+from . import operations as ops
+
+TColumn = tp.Union[npt.NDArray[tp.Any], list[tp.Any]]
+TBatch = dict[str, TColumn]
+TBatchesIterable = tp.Iterable[TBatch]
+TBatchesGenerator = tp.Generator[TBatch, None, None]
+
+
+def _to_column(values: list[tp.Any]) -> TColumn:
+    if values and all(isinstance(val, (int, float, np.number)) for val in values):
+        array = np.asarray(values)
+        if array.dtype.kind in 'biuf':
+            return array
+    return values
+
+
+def _to_list(column: TColumn) -> list[tp.Any]:
+    return column.tolist() if isinstance(column, np.ndarray) else column
+
+
+def _take(column: TColumn, mask: npt.NDArray[np.bool_]) -> TColumn:
+    if isinstance(column, np.ndarray):
+        return column[mask]
+    return list(itertools.compress(column, mask))
+
+
+def _batch_len(batch: TBatch) -> int:
+    return len(next(iter(batch.values()), []))
+
+
+class BatchOperation(ABC):
+    """Base class for operations over batches of columns"""
+    @abstractmethod
+    def __call__(self, batches: TBatchesIterable, *args: tp.Any, **kwargs: tp.Any) -> TBatchesGenerator:
+        pass
+
+
+# Adapters
+
+
+class ToBatches:
+    """
+    Convert rows to batches of columns: numeric columns become numpy arrays, other ones - lists.
+    All rows of a batch must have the same columns
+    """
+    def __init__(self, batch_size: int = 65536) -> None:
+        """
+        :param batch_size: number of rows in batch
+        """
+        self.batch_size = batch_size
+
+    def __call__(self, rows: ops.TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TBatchesGenerator:
+        rows = iter(rows)
+        while chunk := list(itertools.islice(rows, self.batch_size)):
+            yield {col: _to_column([row[col] for row in chunk]) for col in chunk[0]}
+
+
+class ToRows:
+    """Convert batches of columns back to rows"""
+    def __call__(self, batches: TBatchesIterable, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        for batch in batches:
+            columns = list(batch)
+            for row in zip(*map(_to_list, batch.values())):
+                yield dict(zip(columns, row))
+
+
+# Vectorized operations
+
+
+class Filter(BatchOperation):
+    """Remove records that don't satisfy some condition"""
+    def __init__(self, condition: tp.Callable[[TBatch], npt.NDArray[np.bool_]]) -> None:
+        """
+        :param condition: vectorized condition returning boolean mask of records to keep
+        """
+        self.condition = condition
+
+    def __call__(self, batches: TBatchesIterable, *args: tp.Any, **kwargs: tp.Any) -> TBatchesGenerator:
+        for batch in batches:
+            mask = np.asarray(self.condition(batch), dtype=bool)
+            yield {col: _take(values, mask) for col, values in batch.items()}
+
+
+class Project(BatchOperation):
+    """Leave only mentioned columns"""
+    def __init__(self, columns: tp.Sequence[str]) -> None:
+        """
+        :param columns: names of columns
+        """
+        self.columns = columns
+
+    def __call__(self, batches: TBatchesIterable, *args: tp.Any, **kwargs: tp.Any) -> TBatchesGenerator:
+        for batch in batches:
+            yield {col: batch[col] for col in self.columns}
+
+
+class Product(BatchOperation):
+    """Calculates product of multiple numeric columns"""
+    def __init__(self, columns: tp.Sequence[str], result_column: str = 'product') -> None:
+        """
+        :param columns: column names to product
+        :param result_column: column name to save product in
+        """
+        self.columns = columns
+        self.result_column = result_column
+
+    def __call__(self, batches: TBatchesIterable, *args: tp.Any, **kwargs: tp.Any) -> TBatchesGenerator:
+        for batch in batches:
+            res = batch.copy()
+            res[self.result_column] = functools.reduce(operator.mul, (np.asarray(batch[col]) for col in self.columns))
+            yield res
+
+
+class _Aggregate(BatchOperation):
+    """
+    Hash aggregation by keys: every distinct key is given an id, values are accumulated
+    into arrays indexed by these ids. Input doesn't need to be sorted
+    """
+    def __init__(self, column: str, keys: tp.Sequence[str]) -> None:
+        """
+        :param column: name for result column
+        :param keys: columns to group by
+        """
+        self.column = column
+        self.keys = keys
+
+    @abstractmethod
+    def _accumulate(self, totals: npt.NDArray[tp.Any], ids: npt.NDArray[np.intp], batch: TBatch) -> npt.NDArray[tp.Any]:
+        """
+        :param totals: values accumulated so far, one per known key
+        :param ids: key id of every record of the batch
+        :param batch: batch to aggregate
+        :return: updated totals
+        """
+        pass
+
+    def __call__(self, batches: TBatchesIterable, *args: tp.Any, **kwargs: tp.Any) -> TBatchesGenerator:
+        index: dict[tp.Any, int] = dict()
+        totals: npt.NDArray[tp.Any] = np.zeros(0, dtype=np.int64)
+        for batch in batches:
+            key_columns = [_to_list(batch[key]) for key in self.keys]
+            batch_keys = key_columns[0] if len(key_columns) == 1 else zip(*key_columns)
+            ids = np.fromiter((index.setdefault(key, len(index)) for key in batch_keys), dtype=np.intp,
+                              count=_batch_len(batch))
+            if len(totals) < len(index):
+                totals = np.concatenate([totals, np.zeros(len(index) - len(totals), dtype=totals.dtype)])
+            totals = self._accumulate(totals, ids, batch)
+
+        if not index:
+            return
+        keys = list(index)
+        key_columns = [keys] if len(self.keys) == 1 else [list(col) for col in zip(*keys)]
+        result = {key: _to_column(col) for key, col in zip(self.keys, key_columns)}
+        result[self.column] = totals
+        yield result
+
+
+class Sum(_Aggregate):
+    """
+    Sum values of numeric column aggregated by keys
+    Example for keys=('a',) and column='b'
+        {'a': [1, 1, 2], 'b': [2, 3, 4], 'c': [4, 5, 6]}
+        =>
+        {'a': [1, 2], 'b': [5, 4]}
+    """
+    def _accumulate(self, totals: npt.NDArray[tp.Any], ids: npt.NDArray[np.intp], batch: TBatch) -> npt.NDArray[tp.Any]:
+        values = np.asarray(batch[self.column])
+        totals = totals.astype(np.result_type(totals, values), copy=False)
+        np.add.at(totals, ids, values)
+        return totals
+
+
+class Count(_Aggregate):
+    """
+    Count records by keys
+    Example for keys=('a',) and column='d'
+        {'a': [1, 1, 2], 'b': [5, 6, 7]}
+        =>
+        {'a': [1, 2], 'd': [2, 1]}
+    """
+    def _accumulate(self, totals: npt.NDArray[tp.Any], ids: npt.NDArray[np.intp], batch: TBatch) -> npt.NDArray[tp.Any]:
+        return totals + np.bincount(ids, minlength=len(totals))
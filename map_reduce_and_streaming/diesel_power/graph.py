@@ -0,0 +1,125 @@
+import typing as tp
+
+from . import operations as ops
+
+
+class Graph:
+    """
+    Lazy computational graph.
+    Each method returns a new graph node, nothing is computed until `run` is called.
+    Before running the graph is optimized: sorts of already sorted tables are dropped
+    """
+    def __init__(self, operation: ops.Operation, parents: tp.Sequence['Graph'] = (),
+                 sorted_by: tp.Sequence[str] = ()) -> None:
+        """
+        :param operation: operation computing this node
+        :param parents: nodes whose outputs are passed to the operation
+        :param sorted_by: keys the output of this node is known to be sorted by
+        """
+        self._operation = operation
+        self._parents = tuple(parents)
+        self._sorted_by = tuple(sorted_by)
+
+    @property
+    def operation(self) -> ops.Operation:
+        return self._operation
+
+    @property
+    def parents(self) -> tuple['Graph', ...]:
+        return self._parents
+
+    @property
+    def sorted_by(self) -> tuple[str, ...]:
+        return self._sorted_by
+
+    @staticmethod
+    def graph_from_iter(name: str) -> 'Graph':
+        """Construct new graph which reads data from row iterator (in form of sequence of Rows
+        from 'kwargs' passed to 'run' method) into graph data-flow
+        :param name: name of kwarg to use as data source
+        """
+        return Graph(ops.ReadIterFactory(name))
+
+    @staticmethod
+    def graph_from_file(filename: str, parser: tp.Callable[[str], ops.TRow]) -> 'Graph':
+        """Construct new graph extended with operation for reading rows from file
+        :param filename: filename to read from
+        :param parser: parser from string to Row
+        """
+        return Graph(ops.Read(filename, parser))
+
+    def map(self, mapper: ops.Mapper) -> 'Graph':
+        """Construct new graph extended with map operation with particular mapper
+        :param mapper: mapper to use
+        """
+        # Filter neither reorders rows nor changes them
+        sorted_by = self._sorted_by if isinstance(mapper, ops.Filter) else ()
+        return Graph(ops.Map(mapper), (self,), sorted_by)
+
+    def reduce(self, reducer: ops.Reducer, keys: tp.Sequence[str]) -> 'Graph':
+        """Construct new graph extended with reduce operation with particular reducer
+        :param reducer: reducer to use
+        :param keys: keys for grouping
+        """
+        sorted_by = keys if reducer.keeps_keys(keys) else ()
+        return Graph(ops.Reduce(reducer, keys), (self,), sorted_by)
+
+    def sort(self, keys: tp.Sequence[str], **kwargs: tp.Any) -> 'Graph':
+        """Construct new graph extended with sort operation
+        :param keys: sorting keys (typical is tuple of strings)
+        :param kwargs: other ops.Sort arguments
+        """
+        return Graph(ops.Sort(keys, **kwargs), (self,), keys)
+
+    def join(self, joiner: ops.Joiner, join_graph: 'Graph', keys: tp.Sequence[str], **kwargs: tp.Any) -> 'Graph':
+        """Construct new graph extended with join operation with another graph
+        :param joiner: join strategy to use
+        :param join_graph: other graph to join with
+        :param keys: keys for grouping
+        :param kwargs: other ops.Join arguments
+        """
+        operation = ops.Join(joiner, keys, **kwargs)
+        sorted_by = keys if operation.strategy == 'merge' else ()
+        return Graph(operation, (self, join_graph), sorted_by)
+
+    def semi_join(self, join_graph: 'Graph', keys: tp.Sequence[str], false_positive_rate: float = 0.01) -> 'Graph':
+        """Construct new graph without rows having no match in other graph (with Bloom filter false positives)
+        to make the following sort and join cheaper, see ops.SemiJoinFilter
+        :param join_graph: other (small) graph to be joined with
+        :param keys: keys for joining
+        :param false_positive_rate: probability of a non-matching row to be kept
+        """
+        return Graph(ops.SemiJoinFilter(keys, false_positive_rate), (self, join_graph), self._sorted_by)
+
+    def optimize(self) -> 'Graph':
+        """Construct equivalent graph with redundant sorts removed"""
+        return self._optimize(dict())
+
+    def _optimize(self, optimized: dict[int, 'Graph']) -> 'Graph':
+        if id(self) in optimized:
+            return optimized[id(self)]
+
+        parents = tuple(parent._optimize(optimized) for parent in self._parents)
+        operation = self._operation
+        result: Graph
+
+        if isinstance(operation, ops.Sort) and self._is_sorted(parents[0].sorted_by, operation.keys):
+            result = parents[0]
+        else:
+            result = Graph(operation, parents, self._sorted_by)
+
+        optimized[id(self)] = result
+        return result
+
+    @staticmethod
+    def _is_sorted(sorted_by: tp.Sequence[str], keys: tp.Sequence[str]) -> bool:
+        return bool(keys) and tuple(sorted_by[:len(keys)]) == tuple(keys)
+
+    def _execute(self, sources: dict[str, tp.Any]) -> ops.TRowsIterable:
+        if not self._parents:
+            return self._operation(**sources)
+        return self._operation(*(parent._execute(sources) for parent in self._parents))
+
+    def run(self, **kwargs: tp.Any) -> ops.TRowsIterable:
+        """Single method to start execution; data sources passed as kwargs"""
+        return self.optimize()._execute(kwargs)
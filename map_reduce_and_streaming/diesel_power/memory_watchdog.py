@@ -1,13 +1,19 @@
+import tracemalloc
+from contextlib import ContextDecorator
 from os import environ, getpid
 from sys import stderr
 from threading import Thread, Event
-from time import sleep
+from time import perf_counter, sleep
+from types import TracebackType
+from typing import Any, Optional, TextIO, Type
 
 from psutil import Process
 
 VERBOSE = int(environ.get("VERBOSE", "0"))
 SLEEP_PERIOD = float(environ.get("WATCHDOG_PERIOD", "100")) / 1000.0  # in msec
 WIDTH = int(environ.get("PLOT_WIDTH", "100")) // 5 * 5
+SNAPSHOT_INTERVAL = float(environ.get("WATCHDOG_SNAPSHOT_INTERVAL", "200")) / 1000.0  # in msec
+SNAPSHOT_TIME_SHARE = float(environ.get("WATCHDOG_SNAPSHOT_TIME_SHARE", "10")) / 100.0  # in percents
 SELF_PROCESS = Process(getpid())
 
 
@@ -15,14 +21,33 @@ class MemoryWatchdog(Thread):
     """
     This class implements thread watching for current process memory consumption.
     Watchdog may be configured using the environment variables above.
+    If allocations are traced, tracemalloc snapshot is taken when the maximum memory usage grows,
+    so the allocation sites of the peak may be reported. Snapshots of a large heap are slow and hold the GIL,
+    so they are taken at least SNAPSHOT_INTERVAL apart and take at most SNAPSHOT_TIME_SHARE of the time.
+    If the maximum grows in between, the snapshot is taken as soon as it's allowed, if the usage is still
+    at the maximum.
     """
 
-    def __init__(self, limit: int, is_baseline: bool = False) -> None:
+    def __init__(self, limit: int, is_baseline: bool = False, trace_allocations: bool = False,
+                 top_sites: int = 10) -> None:
+        """
+        :param limit: memory limit in bytes, used for plotting
+        :param is_baseline: don't print the maximum memory usage
+        :param trace_allocations: take tracemalloc snapshots at peak memory usage, tracemalloc must be started
+        :param top_sites: number of allocation sites to report
+        """
         self._stop_event = Event()
         self.maximum_memory_usage = 0
         self.limit = limit
         self.limit_in_kib = limit // 1024
         self._is_baseline = is_baseline
+        self.trace_allocations = trace_allocations
+        self.top_sites = top_sites
+        self.peak_snapshot: Optional[tracemalloc.Snapshot] = None
+        self._snapshot_usage = 0
+        self._next_snapshot_usage = 0
+        self._next_snapshot_time = 0.0
+        self._top_sites: Optional[tuple[tracemalloc.Snapshot, list[tracemalloc.Statistic]]] = None
 
         if VERBOSE:
             # To not interfere with pytest output.
@@ -45,6 +70,9 @@ class MemoryWatchdog(Thread):
             usage = SELF_PROCESS.memory_info().rss
             usage_in_kib = usage // 1024
             self.maximum_memory_usage = max(self.maximum_memory_usage, usage)
+            if self.trace_allocations and tracemalloc.is_tracing() and usage == self.maximum_memory_usage \
+                    and usage > self._next_snapshot_usage and perf_counter() >= self._next_snapshot_time:
+                self._take_snapshot(usage)
 
             if VERBOSE:
                 line = str(usage_in_kib).ljust(9) + "|" + "=" * min(WIDTH, usage * WIDTH // self.limit)
@@ -55,8 +83,94 @@ class MemoryWatchdog(Thread):
             sleep(SLEEP_PERIOD)
 
         if not self._is_baseline:
-            print("Maximum memory usage / limit (in KiB):",
-                  self.maximum_memory_usage // 1024, "/", self.limit // 1024, file=stderr)
+            self.report(stderr)
+
+    def _take_snapshot(self, usage: int) -> None:
+        self.peak_snapshot = None  # let the previous snapshot be freed before the new one is taken
+        start = perf_counter()
+        self.peak_snapshot = tracemalloc.take_snapshot()
+        end = perf_counter()
+        self._snapshot_usage = usage
+        # Growth caused by the snapshot itself doesn't make the next one
+        self._next_snapshot_usage = max(usage, SELF_PROCESS.memory_info().rss)
+        self._next_snapshot_time = end + max(SNAPSHOT_INTERVAL, (end - start) / SNAPSHOT_TIME_SHARE)
+
+    def report(self, file: TextIO = stderr) -> None:
+        """Print the maximum memory usage and top allocation sites at peak if they are traced"""
+        print("Maximum memory usage / limit (in KiB):",
+              self.maximum_memory_usage // 1024, "/", self.limit // 1024, file=file)
+        if self.peak_snapshot is not None:
+            self.report_top_sites(file)
 
     def stop(self) -> None:
         self._stop_event.set()
+
+    def top_allocation_sites(self) -> list[tracemalloc.Statistic]:
+        """Source lines allocated most of memory traced at peak usage"""
+        if self.peak_snapshot is None:
+            return []
+        if self._top_sites is None or self._top_sites[0] is not self.peak_snapshot:
+            ignored = {tracemalloc.__file__, __file__}
+            stats = [stat for stat in self.peak_snapshot.statistics("lineno")
+                     if stat.traceback[0].filename not in ignored]
+            self._top_sites = self.peak_snapshot, stats[:self.top_sites]
+        return self._top_sites[1]
+
+    def report_top_sites(self, file: TextIO = stderr) -> None:
+        print(f"Top allocation sites at peak memory usage ({self._snapshot_usage // 1024} KiB):", file=file)
+        for stat in self.top_allocation_sites():
+            print(f"  {stat.traceback[0]}: {stat.size // 1024} KiB in {stat.count} blocks", file=file)
+
+
+class watch_memory(ContextDecorator):
+    """
+    Watch memory consumption of a code block or a function, with allocations tracing by default:
+
+        with watch_memory(limit=100 * MiB) as watchdog:
+            ...
+        print(watchdog.top_allocation_sites())
+
+        @watch_memory(limit=100 * MiB)
+        def job() -> None:
+            ...
+
+    Maximum memory usage and top allocation sites are printed to stderr at the end.
+    New watchdog thread is started on each enter, the last one is available as `watchdog` attribute.
+    It may be entered again while active, e.g. by a recursive decorated function, then tracing is stopped
+    by the exit matching the enter which started it
+    """
+
+    def __init__(self, limit: int, trace_allocations: bool = True, top_sites: int = 10, frames: int = 1) -> None:
+        """
+        :param limit: memory limit in bytes, used for plotting
+        :param trace_allocations: whether to take tracemalloc snapshots at peak
+        :param top_sites: number of allocation sites to report
+        :param frames: number of frames tracemalloc stores for each allocation
+        """
+        self.limit = limit
+        self.trace_allocations = trace_allocations
+        self.top_sites = top_sites
+        self.frames = frames
+        self.watchdog: Optional[MemoryWatchdog] = None
+        self._active: list[tuple[MemoryWatchdog, bool]] = []  # watchdogs of nested enters and if they started tracing
+
+    def __enter__(self) -> MemoryWatchdog:
+        started_tracing = self.trace_allocations and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(self.frames)
+        # Report is printed on exit, when tracing is stopped: grouping snapshot traces is much slower while tracing
+        self.watchdog = MemoryWatchdog(self.limit, is_baseline=True, trace_allocations=self.trace_allocations,
+                                       top_sites=self.top_sites)
+        self._active.append((self.watchdog, started_tracing))
+        self.watchdog.start()
+        return self.watchdog
+
+    def __exit__(self, exc_type: Optional[Type[BaseException]], exc: Optional[BaseException],
+                 traceback: Optional[TracebackType]) -> Any:
+        watchdog, started_tracing = self._active.pop()
+        watchdog.stop()
+        watchdog.join()
+        if started_tracing:
+            tracemalloc.stop()
+        watchdog.report(stderr)
+        return None
@@ -1,19 +1,35 @@
 import functools
 import heapq
+import importlib
 import itertools
+import json
+import math
+import mmap
+import multiprocessing
+import multiprocessing.pool
 import operator
-import re
-import string
+import os
+import pickle
+import queue
+import struct
+import sys
+import tempfile
+import threading
 import typing as tp
 from abc import ABC, abstractmethod
-from collections import defaultdict
+from collections import Counter, defaultdict, deque
 from collections.abc import Generator, Sequence
 from typing import Any, Optional
 
+from . import text
+from .bloom import BloomFilter
+
 TRow = dict[str, tp.Any]
 TRowsIterable = tp.Iterable[TRow]
 TRowsGenerator = tp.Generator[TRow, None, None]
 
+BINARY_MAGIC = b'DPROWS\x00\x01'
+
 
 class Operation(ABC):
     @abstractmethod
@@ -32,6 +48,278 @@ class Read(Operation):
                 yield self.parser(line)
 
 
+class ReadMmap(Operation):
+    """
+    Read rows from memory-mapped file.
+    The mapping is cut into blocks of whole lines with bytes.find, lines are decoded one by one
+    (or not decoded at all if the parser accepts bytes). Reading may be limited to a byte range, so that several workers
+    can read one file: a line belongs to the range its first byte belongs to
+    """
+    BLOCK_SIZE = 1 << 20  # bytes split into lines at once
+
+    def __init__(self, filename: str, parser: tp.Callable[[tp.Any], TRow], start: int = 0,
+                 end: Optional[int] = None, encoding: Optional[str] = 'utf-8') -> None:
+        """
+        :param filename: file to read from
+        :param parser: parser from line to Row
+        :param start: offset of the first byte of range to read
+        :param end: offset of the byte after the range to read, end of file by default
+        :param encoding: encoding to decode lines with, if None parser gets raw bytes
+        """
+        self.filename = filename
+        self.parser = parser
+        self.start = start
+        self.end = end
+        self.encoding = encoding
+
+    @staticmethod
+    def split_ranges(filename: str, parts: int) -> list[tuple[int, int]]:
+        """
+        Split file into byte ranges of almost equal size
+        :param filename: file to split
+        :param parts: number of ranges
+        """
+        size = os.path.getsize(filename)
+        bounds = [size * i // parts for i in range(parts + 1)]
+        return list(zip(bounds, bounds[1:]))
+
+    def __call__(self, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        if os.path.getsize(self.filename) == 0:  # empty files can't be mapped
+            return
+        with open(self.filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            end = size if self.end is None else min(self.end, size)
+            pos = self.start
+            if 0 < pos < size and mm[pos - 1] != ord('\n'):
+                # the line started in the previous range
+                newline = mm.find(b'\n', pos)
+                pos = size if newline == -1 else newline + 1
+
+            while pos < end:
+                # block of whole lines which start before the block limit
+                newline = mm.find(b'\n', min(pos + self.BLOCK_SIZE, end) - 1)
+                stop = size if newline == -1 else newline + 1
+                for line in mm[pos:stop].splitlines(keepends=True):
+                    yield self.parser(line if self.encoding is None else line.decode(self.encoding))
+                pos = stop
+
+
+_FRAME_HEADER = struct.Struct('<Q')
+
+
+def _write_frames(file: tp.BinaryIO, rows: TRowsIterable, chunk_size: int) -> None:
+    """Write rows as length-prefixed frames, each one is a pickled list of at most `chunk_size` rows"""
+    rows = iter(rows)
+    while chunk := list(itertools.islice(rows, chunk_size)):
+        frame = pickle.dumps(chunk, protocol=pickle.HIGHEST_PROTOCOL)
+        file.write(_FRAME_HEADER.pack(len(frame)))
+        file.write(frame)
+
+
+def _read_frames(file: tp.BinaryIO) -> TRowsGenerator:
+    """Read rows written by `_write_frames`"""
+    while header := file.read(_FRAME_HEADER.size):
+        if len(header) < _FRAME_HEADER.size:
+            raise ValueError('Truncated frame header')
+        size, = _FRAME_HEADER.unpack(header)
+        frame = file.read(size)
+        if len(frame) < size:
+            raise ValueError('Truncated frame')
+        yield from pickle.loads(frame)
+
+
+class ReadBinary(Operation):
+    """Read rows from file in binary format written by WriteBinary"""
+    def __init__(self, filename: str, buffer_size: int = 1 << 20) -> None:
+        """
+        :param filename: file to read from
+        :param buffer_size: size of read buffer in bytes
+        """
+        self.filename = filename
+        self.buffer_size = buffer_size
+
+    def __call__(self, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        with open(self.filename, 'rb', buffering=self.buffer_size) as f:
+            if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+                raise ValueError(f'{self.filename} is not a binary rows file')
+            yield from _read_frames(f)
+
+
+class WriteBinary(Operation):
+    """
+    Write rows to file in compact binary format (length-prefixed frames of pickled rows)
+    and pass them further, so it may be used to checkpoint intermediate tables.
+    Rows are written to a temporary file in the same directory which replaces the target one
+    only when all the rows are written, so an interrupted pipeline doesn't leave a truncated file
+    """
+    def __init__(self, filename: str, chunk_size: int = 1024, buffer_size: int = 1 << 20) -> None:
+        """
+        :param filename: file to write to
+        :param chunk_size: number of rows in one frame
+        :param buffer_size: size of write buffer in bytes
+        """
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self.buffer_size = buffer_size
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        fd, tmp_filename = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.filename)),
+                                            prefix=os.path.basename(self.filename) + '.', suffix='.tmp')
+        try:
+            with open(fd, 'wb', buffering=self.buffer_size) as f:
+                f.write(BINARY_MAGIC)
+                rows = iter(rows)
+                while chunk := list(itertools.islice(rows, self.chunk_size)):
+                    _write_frames(f, chunk, self.chunk_size)
+                    yield from chunk
+            os.replace(tmp_filename, self.filename)
+        finally:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+
+
+COMPRESSIONS = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'lzma', '.lzma': 'lzma', '.zst': 'zstd'}
+
+
+def _open_text(filename: str, mode: str, compression: Optional[str], encoding: str) -> tp.TextIO:
+    """
+    Open text file, compressed with `compression` if it's set
+    :param compression: 'gzip', 'bz2', 'lzma', 'zstd' (Python 3.14+), 'auto' to guess by file extension or None
+    """
+    if compression == 'auto':
+        compression = COMPRESSIONS.get(os.path.splitext(filename)[1])
+    if compression is None:
+        return tp.cast(tp.TextIO, open(filename, mode + 't', encoding=encoding))
+    module_name = 'compression.zstd' if compression == 'zstd' else compression
+    if compression not in COMPRESSIONS.values():
+        raise ValueError(f'Unknown compression {compression}')
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError as e:
+        raise ValueError(f'{compression} compression is not supported by this Python version') from e
+    return tp.cast(tp.TextIO, module.open(filename, mode + 't', encoding=encoding))
+
+
+class _Failure:
+    """Exception raised in background thread, passed through queue to be raised in consumer"""
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+_END = object()  # end of data marker
+
+
+def _put(items: 'queue.Queue[Any]', item: Any, stop: threading.Event) -> bool:
+    """Put item into bounded queue unless consumer stopped, return whether item was put"""
+    while not stop.is_set():
+        try:
+            items.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+class Source(Operation):
+    """
+    Read rows from text file (maybe compressed) on a background thread:
+    reading, decompression and parsing of next chunks overlap with processing of current ones.
+    Read ahead is limited by bounded queue of chunks
+    """
+    def __init__(self, filename: str, parser: tp.Callable[[str], TRow], compression: Optional[str] = 'auto',
+                 chunk_size: int = 1024, queue_size: int = 16, encoding: str = 'utf-8') -> None:
+        """
+        :param filename: file to read from
+        :param parser: parser from string to Row
+        :param compression: 'gzip', 'bz2', 'lzma', 'zstd' (Python 3.14+), None or 'auto' to guess by extension
+        :param chunk_size: number of lines parsed and passed through queue at once
+        :param queue_size: maximum number of chunks read ahead
+        :param encoding: file encoding
+        """
+        self.filename = filename
+        self.parser = parser
+        self.compression = compression
+        self.chunk_size = chunk_size
+        self.queue_size = queue_size
+        self.encoding = encoding
+
+    def _produce(self, chunks: 'queue.Queue[Any]', stop: threading.Event) -> None:
+        try:
+            with _open_text(self.filename, 'r', self.compression, self.encoding) as f:
+                while lines := list(itertools.islice(f, self.chunk_size)):
+                    if not _put(chunks, [self.parser(line) for line in lines], stop):
+                        return
+            _put(chunks, _END, stop)
+        except BaseException as e:
+            _put(chunks, _Failure(e), stop)
+
+    def __call__(self, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        chunks: queue.Queue[Any] = queue.Queue(self.queue_size)
+        stop = threading.Event()
+        thread = threading.Thread(target=self._produce, args=(chunks, stop), daemon=True)
+        thread.start()
+        try:
+            while (chunk := chunks.get()) is not _END:
+                if isinstance(chunk, _Failure):
+                    raise chunk.error
+                yield from chunk
+        finally:
+            stop.set()
+            thread.join()
+
+
+class Sink(Operation):
+    """
+    Write rows to text file (maybe compressed) and pass them further.
+    Rows are formatted in the calling thread, while compression and writing are done by a background thread
+    """
+    def __init__(self, filename: str, formatter: tp.Callable[[TRow], str] = json.dumps,
+                 compression: Optional[str] = 'auto', chunk_size: int = 1024, queue_size: int = 16,
+                 encoding: str = 'utf-8') -> None:
+        """
+        :param filename: file to write to
+        :param formatter: formatter from Row to string, json by default
+        :param compression: 'gzip', 'bz2', 'lzma', 'zstd' (Python 3.14+), None or 'auto' to guess by extension
+        :param chunk_size: number of rows passed to writer at once
+        :param queue_size: maximum number of chunks waiting to be written
+        :param encoding: file encoding
+        """
+        self.filename = filename
+        self.formatter = formatter
+        self.compression = compression
+        self.chunk_size = chunk_size
+        self.queue_size = queue_size
+        self.encoding = encoding
+
+    def _consume(self, chunks: 'queue.Queue[Any]', errors: list[BaseException]) -> None:
+        try:
+            with _open_text(self.filename, 'w', self.compression, self.encoding) as f:
+                while (chunk := chunks.get()) is not _END:
+                    f.writelines(chunk)
+        except BaseException as e:
+            errors.append(e)
+            # Drain queue so that producer doesn't block
+            while chunks.get() is not _END:
+                pass
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        chunks: queue.Queue[Any] = queue.Queue(self.queue_size)
+        errors: list[BaseException] = []
+        thread = threading.Thread(target=self._consume, args=(chunks, errors), daemon=True)
+        thread.start()
+        try:
+            rows = iter(rows)
+            while (chunk := list(itertools.islice(rows, self.chunk_size))) and not errors:
+                # Rows are formatted before being passed further, as they may be changed there
+                chunks.put([self.formatter(row) + '\n' for row in chunk])
+                yield from chunk
+        finally:
+            chunks.put(_END)
+            thread.join()
+        if errors:
+            raise errors[0]
+
+
 class ReadIterFactory(Operation):
     def __init__(self, name: str) -> None:
         self.name = name
@@ -63,8 +351,129 @@ class Map(Operation):
             yield from self.mapper(row)
 
 
+TBatchFunction = tp.Callable[[list[TRow]], list[TRow]]
+
+_worker_function: Optional[TBatchFunction] = None
+
+
+def _check_picklable(obj: Any) -> None:
+    try:
+        pickle.dumps(obj)
+    except (pickle.PicklingError, AttributeError, TypeError) as e:
+        raise pickle.PicklingError(f'{obj!r} can not be pickled to be sent to worker processes: {e}') from e
+
+
+def _init_worker(function: TBatchFunction) -> None:
+    global _worker_function
+    _worker_function = function
+
+
+def _process_batch(batch: list[TRow]) -> list[TRow]:
+    assert _worker_function is not None
+    return _worker_function(batch)
+
+
+class _BatchPool:
+    """
+    Apply function to batches of rows in a pool of worker processes.
+    Number of batches in flight is limited, so input is not read ahead unboundedly
+    """
+    def __init__(self, function: TBatchFunction, workers: Optional[int], batch_size: int, ordered: bool) -> None:
+        """
+        :param function: function to apply to batches, it must be picklable
+        :param workers: number of worker processes, os.cpu_count() by default
+        :param batch_size: number of rows sent to a worker at once
+        :param ordered: whether to yield processed batches in the input order or as soon as they are processed
+        """
+        _check_picklable(function)
+        self.function = function
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.ordered = ordered
+
+    def _batches(self, rows: TRowsIterable) -> tp.Iterator[list[TRow]]:
+        rows = iter(rows)
+        while batch := list(itertools.islice(rows, self.batch_size)):
+            yield batch
+
+    def _run_ordered(self, pool: multiprocessing.pool.Pool, batches: tp.Iterable[list[TRow]]
+                     ) -> tp.Iterator[list[TRow]]:
+        pending: deque[multiprocessing.pool.AsyncResult[list[TRow]]] = deque()
+        for batch in batches:
+            pending.append(pool.apply_async(_process_batch, (batch,)))
+            if len(pending) >= 2 * self.workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+    def _run_unordered(self, pool: multiprocessing.pool.Pool, batches: tp.Iterable[list[TRow]]
+                       ) -> tp.Iterator[list[TRow]]:
+        done: queue.SimpleQueue[list[TRow] | BaseException] = queue.SimpleQueue()
+        in_flight = 0
+
+        def take() -> list[TRow]:
+            result = done.get()
+            if isinstance(result, BaseException):
+                raise result
+            return result
+
+        for batch in batches:
+            pool.apply_async(_process_batch, (batch,), callback=done.put, error_callback=done.put)
+            in_flight += 1
+            if in_flight >= 2 * self.workers:
+                in_flight -= 1
+                yield take()
+        for _ in range(in_flight):
+            yield take()
+
+    def __call__(self, rows: TRowsIterable) -> tp.Iterator[list[TRow]]:
+        with multiprocessing.Pool(self.workers, initializer=_init_worker, initargs=(self.function,)) as pool:
+            if self.ordered:
+                yield from self._run_ordered(pool, self._batches(rows))
+            else:
+                yield from self._run_unordered(pool, self._batches(rows))
+
+
+class _MapBatch:
+    """Apply mapper to every row of a batch"""
+    def __init__(self, mapper: Mapper) -> None:
+        self.mapper = mapper
+
+    def __call__(self, batch: list[TRow]) -> list[TRow]:
+        return [result for row in batch for result in self.mapper(row)]
+
+
+class ParallelMap(Operation):
+    """
+    Map which sends batches of rows to a pool of worker processes.
+    Results are yielded either in the input order or as soon as batches are processed
+    """
+    def __init__(self, mapper: Mapper, workers: Optional[int] = None, batch_size: int = 1024,
+                 ordered: bool = True) -> None:
+        """
+        :param mapper: mapper to apply, it must be picklable
+        :param workers: number of worker processes, os.cpu_count() by default
+        :param batch_size: number of rows sent to a worker at once
+        :param ordered: whether to keep the order of rows
+        """
+        self.mapper = mapper
+        self._pool = _BatchPool(_MapBatch(mapper), workers, batch_size, ordered)
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        for batch in self._pool(rows):
+            yield from batch
+
+
 class Reducer(ABC):
     """Base class for reducers"""
+    def keeps_keys(self, keys: tp.Sequence[str]) -> bool:
+        """
+        Whether every output row of a group has the same values of `keys` as the group,
+        so reduce output of a table sorted by `keys` is sorted by them too
+        :param keys: keys for grouping
+        """
+        return False
+
     @abstractmethod
     def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
         """
@@ -83,11 +492,171 @@ class Reduce(Operation):
             yield from self.reducer(tuple(self.keys), val)
 
 
+def _reduce_shard(reducer: Reducer, keys: tp.Sequence[str], memory_limit: int, path: str) -> str:
+    """Sort and reduce rows of one shard file, return name of the file with results"""
+    result_path = path + '.reduced'
+    with open(path, 'rb') as f_in, open(result_path, 'wb') as f_out:
+        rows = Sort(keys, memory_limit)(_read_frames(f_in))
+        _write_frames(f_out, Reduce(reducer, keys)(rows), PartitionedReduce.SPILL_CHUNK_SIZE)
+    os.remove(path)
+    return result_path
+
+
+class PartitionedReduce(Operation):
+    """
+    Reduce in a pool of worker processes. Rows are hash-partitioned by keys into shard files,
+    so every key group gets into a single shard, then each shard is sorted and reduced in its own process.
+    Input doesn't need to be sorted. Output of a shard is sorted by keys,
+    shards are yielded in the order they are finished
+    """
+    SPILL_CHUNK_SIZE = 1024  # rows pickled together in shard files
+
+    def __init__(self, reducer: Reducer, keys: tp.Sequence[str], partitions: Optional[int] = None,
+                 workers: Optional[int] = None, memory_limit: int = 64 * 1024 * 1024) -> None:
+        """
+        :param reducer: reducer to apply, it must be picklable
+        :param keys: keys for grouping
+        :param partitions: number of shards, number of workers by default
+        :param workers: number of worker processes, os.cpu_count() by default
+        :param memory_limit: memory limit of sorting a shard in a worker, see Sort
+        """
+        _check_picklable(reducer)
+        self.reducer = reducer
+        self.keys = keys
+        self.workers = workers or os.cpu_count() or 1
+        self.partitions = partitions or self.workers
+        self.memory_limit = memory_limit
+
+    def _partition(self, rows: TRowsIterable, directory: str) -> list[str]:
+        paths = [os.path.join(directory, f'shard-{i}') for i in range(self.partitions)]
+        files = [open(path, 'wb') for path in paths]
+        buffers: list[list[TRow]] = [[] for _ in paths]
+        key = operator.itemgetter(*self.keys)
+        try:
+            for row in rows:
+                shard = hash(key(row)) % self.partitions
+                buffers[shard].append(row)
+                if len(buffers[shard]) >= self.SPILL_CHUNK_SIZE:
+                    _write_frames(files[shard], buffers[shard], self.SPILL_CHUNK_SIZE)
+                    buffers[shard].clear()
+            for file, buffer in zip(files, buffers):
+                _write_frames(file, buffer, self.SPILL_CHUNK_SIZE)
+        finally:
+            for file in files:
+                file.close()
+        return paths
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        with tempfile.TemporaryDirectory() as directory:
+            paths = self._partition(rows, directory)
+            reduce_shard = functools.partial(_reduce_shard, self.reducer, tuple(self.keys), self.memory_limit)
+            with multiprocessing.Pool(min(self.workers, self.partitions)) as pool:
+                for result_path in pool.imap_unordered(reduce_shard, paths):
+                    with open(result_path, 'rb') as f:
+                        yield from _read_frames(f)
+                    os.remove(result_path)
+
+
+class Combiner(ABC):
+    """Base class for combiners, which fold rows with equal keys into partial aggregates"""
+    @abstractmethod
+    def __call__(self, group_key: tuple[str, ...], partial: Optional[TRow], row: TRow) -> TRow:
+        """
+        :param group_key: names of key columns
+        :param partial: partial aggregate of previous rows with the same key, None for the first row
+        :param row: table row to add to the partial aggregate
+        :return: updated partial aggregate
+        """
+        pass
+
+
+class Combine(Operation):
+    """
+    Map-side partial aggregation: rows with equal keys are folded together in a hash table
+    of bounded size, which is flushed when it becomes full.
+    Output is not sorted and may contain several partial aggregates for the same key,
+    so it has to be sorted and reduced by a reducer that merges partial aggregates
+    """
+    def __init__(self, combiner: Combiner, keys: tp.Sequence[str], max_groups: int = 65536) -> None:
+        """
+        :param combiner: combiner to fold rows with
+        :param keys: columns to group by
+        :param max_groups: maximum number of partial aggregates kept in memory
+        """
+        self.combiner = combiner
+        self.keys = keys
+        self.max_groups = max_groups
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        group_key = tuple(self.keys)
+        partials: dict[tuple[Any, ...], TRow] = dict()
+        for row in rows:
+            key = tuple(row[col] for col in group_key)
+            partials[key] = self.combiner(group_key, partials.get(key), row)
+            if len(partials) >= self.max_groups:
+                yield from partials.values()
+                partials.clear()
+        yield from partials.values()
+
+
+class _RowsCache:
+    """
+    Rows that can be iterated many times. Keeps at most `max_rows` rows in memory,
+    if there are more of them all the rows are spilled to a temporary file and re-read on every iteration.
+    Iterations must not interleave
+    """
+    SPILL_CHUNK_SIZE = 128  # rows pickled together in spilled file
+
+    def __init__(self, rows: TRowsIterable, max_rows: int) -> None:
+        """
+        :param rows: rows to cache
+        :param max_rows: maximum number of rows kept in memory
+        """
+        rows = iter(rows)
+        self._rows = list(itertools.islice(rows, max_rows))
+        self._file: Optional[tp.BinaryIO] = None
+        for extra in rows:
+            self._file = tp.cast(tp.BinaryIO, tempfile.TemporaryFile())
+            _write_frames(self._file, itertools.chain(self._rows, (extra,), rows), self.SPILL_CHUNK_SIZE)
+            self._rows = []
+
+    @property
+    def spilled(self) -> bool:
+        return self._file is not None
+
+    def __bool__(self) -> bool:
+        return self.spilled or bool(self._rows)
+
+    def __iter__(self) -> tp.Iterator[TRow]:
+        if self._file is None:
+            return iter(self._rows)
+        self._file.seek(0)
+        return _read_frames(self._file)
+
+    def __enter__(self) -> '_RowsCache':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
 class Joiner(ABC):
     """Base class for joiners"""
-    def __init__(self, suffix_a: str = '_1', suffix_b: str = '_2') -> None:
+    def __init__(self, suffix_a: str = '_1', suffix_b: str = '_2', spill_threshold: int = 65536) -> None:
+        """
+        :param suffix_a: suffix for left table columns with the same names
+        :param suffix_b: suffix for right table columns with the same names
+        :param spill_threshold: key groups with more rows than this are spilled to disk instead of memory
+        """
         self._a_suffix = suffix_a
         self._b_suffix = suffix_b
+        self.spill_threshold = spill_threshold
+
+    def _cache(self, rows: TRowsIterable) -> _RowsCache:
+        """Cache rows of one key group to iterate over them many times"""
+        return _RowsCache(rows, self.spill_threshold)
 
     def _join_rows(self, keys: Sequence[str], row_a: TRow, row_b: TRow) -> TRow:
         cols = (row_a.keys() & row_b.keys()) - set(keys)
@@ -109,9 +678,35 @@ class Joiner(ABC):
 
 
 class Join(Operation):
-    def __init__(self, joiner: Joiner, keys: tp.Sequence[str]):
+    """
+    Join two tables by keys.
+    Strategies:
+        'merge' - sort-merge join, both tables must be sorted by keys
+        'hash' - hash join, rows of the smaller table are put into a dict and the other one is streamed against it,
+                 tables may be unsorted. Tables are read in lockstep to find the smaller one,
+                 so as many rows of the larger table as the smaller one has are kept in memory as well
+        'auto' - hash join if one of tables has at most `hash_join_threshold` rows, merge join otherwise.
+                 Tables may be unsorted, they are sorted with Sort before merge join
+    """
+    STRATEGIES = ('merge', 'hash', 'auto')
+
+    def __init__(self, joiner: Joiner, keys: tp.Sequence[str], strategy: str = 'merge',
+                 hash_join_threshold: int = 100000) -> None:
+        """
+        :param joiner: joiner to apply to groups of rows with equal keys
+        :param keys: join keys
+        :param strategy: one of 'merge', 'hash' or 'auto'
+        :param hash_join_threshold: maximum size of the smaller table for 'auto' strategy to choose hash join
+        """
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f'Unknown join strategy {strategy!r}, expected one of {self.STRATEGIES}')
         self.keys = keys
         self.joiner = joiner
+        self.strategy = strategy
+        self.hash_join_threshold = hash_join_threshold
+
+    def _key(self, row: TRow) -> tuple[Any, ...]:
+        return tuple(row[key] for key in self.keys)
 
     def _row_selector(self, rows: TRowsIterable
                       ) -> Generator[tuple[Optional[tuple[Any, ...]], Optional[TRowsIterable]], None, None]:
@@ -121,9 +716,9 @@ class Join(Operation):
             yield tuple(), rows
         yield None, None
 
-    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
-        f_grouper = self._row_selector(rows)
-        s_grouper = self._row_selector(args[0])
+    def _merge_join(self, rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:
+        f_grouper = self._row_selector(rows_a)
+        s_grouper = self._row_selector(rows_b)
         f_key, f_group = next(f_grouper)
         s_key, s_group = next(s_grouper)
 
@@ -152,6 +747,204 @@ class Join(Operation):
             yield from self.joiner(self.keys, [], s_group or [])
             s_key, s_group = next(s_grouper)
 
+    def _hash_join(self, build_rows: TRowsIterable, probe_rows: TRowsIterable, build_is_left: bool) -> TRowsGenerator:
+        table: defaultdict[tuple[Any, ...], list[TRow]] = defaultdict(list)
+        for row in build_rows:
+            table[self._key(row)].append(row)
+
+        matched: set[tuple[Any, ...]] = set()
+        for key, group in itertools.groupby(probe_rows, self._key):
+            build_group = table.get(key, [])
+            if build_group:
+                matched.add(key)
+            if build_is_left:
+                yield from self.joiner(self.keys, build_group, group)
+            else:
+                yield from self.joiner(self.keys, group, build_group)
+
+        for key, build_group in table.items():
+            if key in matched:
+                continue
+            if build_is_left:
+                yield from self.joiner(self.keys, build_group, [])
+            else:
+                yield from self.joiner(self.keys, [], build_group)
+
+    @staticmethod
+    def _read_heads(rows_a: tp.Iterator[TRow], rows_b: tp.Iterator[TRow], limit: float
+                    ) -> tuple[Optional[bool], list[TRow], list[TRow]]:
+        """
+        Read both tables in lockstep until one of them is exhausted or `limit` rows are read from each
+        :return: whether exhausted table is the left one (None if none is exhausted) and rows read from both tables
+        """
+        head_a: list[TRow] = []
+        head_b: list[TRow] = []
+        while len(head_a) < limit:
+            row_a = next(rows_a, None)
+            if row_a is None:
+                return True, head_a, head_b
+            head_a.append(row_a)
+
+            row_b = next(rows_b, None)
+            if row_b is None:
+                return False, head_a, head_b
+            head_b.append(row_b)
+        return None, head_a, head_b
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        if self.strategy == 'merge':
+            yield from self._merge_join(rows, args[0])
+            return
+
+        rows_a, rows_b = iter(rows), iter(args[0])
+        limit = self.hash_join_threshold if self.strategy == 'auto' else math.inf
+        small_is_left, head_a, head_b = self._read_heads(rows_a, rows_b, limit)
+
+        if small_is_left is None:
+            sort = Sort(self.keys)
+            yield from self._merge_join(sort(itertools.chain(head_a, rows_a)), sort(itertools.chain(head_b, rows_b)))
+        elif small_is_left:
+            yield from self._hash_join(head_a, itertools.chain(head_b, rows_b), build_is_left=True)
+        else:
+            yield from self._hash_join(head_b, itertools.chain(head_a, rows_a), build_is_left=False)
+
+
+class SemiJoinFilter(Operation):
+    """
+    Drop rows which have no match in other (small) table before they are sorted or joined.
+    Keys of the other table are put into a Bloom filter, so some non-matching rows may pass
+    with probability about `false_positive_rate`. Order of rows is kept.
+    It's valid only for rows whose unmatched ones are not output by the join:
+    both sides of inner join, right side of left join, left side of right join
+    """
+    def __init__(self, keys: tp.Sequence[str], false_positive_rate: float = 0.01) -> None:
+        """
+        :param keys: join keys
+        :param false_positive_rate: probability of a non-matching row passing the filter
+        """
+        if not 0 < false_positive_rate < 1:
+            raise ValueError(f'False positive rate must be between 0 and 1, got {false_positive_rate}')
+        self.keys = keys
+        self.false_positive_rate = false_positive_rate
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        """
+        :param rows: rows to filter
+        :param args: rows of the other table
+        """
+        key = operator.itemgetter(*self.keys)
+        other_keys = list(map(key, args[0]))
+        bloom_filter = BloomFilter(len(other_keys), self.false_positive_rate)
+        for other_key in other_keys:
+            bloom_filter.add(other_key)
+        del other_keys
+
+        for row in rows:
+            if key(row) in bloom_filter:
+                yield row
+
+
+class Sort(Operation):
+    """
+    Sort rows by keys in bounded memory.
+    Rows are collected into runs of limited size, each run is sorted and spilled
+    to a temporary file, then all runs are k-way merged back with heapq.merge
+    """
+    SPILL_CHUNK_SIZE = 128  # rows pickled together in spilled runs
+
+    def __init__(self, keys: tp.Sequence[str], memory_limit: int = 64 * 1024 * 1024, merge_fan_in: int = 64) -> None:
+        """
+        :param keys: columns to sort by
+        :param memory_limit: approximate size of rows (in bytes) kept in memory at once
+        :param merge_fan_in: maximum number of spilled runs merged in one pass, at least 2
+        """
+        if merge_fan_in < 2:
+            raise ValueError(f'Merge fan-in must be at least 2, got {merge_fan_in}')
+        self.keys = keys
+        self.memory_limit = memory_limit
+        self.merge_fan_in = merge_fan_in
+
+    @staticmethod
+    def _row_size(row: TRow) -> int:
+        return sys.getsizeof(row) + sum(sys.getsizeof(val) for val in row.values())
+
+    def _dump_run(self, rows: TRowsIterable) -> tp.BinaryIO:
+        file = tp.cast(tp.BinaryIO, tempfile.TemporaryFile())
+        _write_frames(file, rows, self.SPILL_CHUNK_SIZE)
+        file.seek(0)
+        return file
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        if not self.keys:
+            yield from rows
+            return
+
+        key = operator.itemgetter(*self.keys)
+        runs: list[tp.BinaryIO] = []
+        merged_runs: list[tp.BinaryIO] = []
+        try:
+            run: list[TRow] = []
+            run_size = 0
+            for row in rows:
+                run.append(row)
+                run_size += self._row_size(row)
+                if run_size >= self.memory_limit:
+                    run.sort(key=key)
+                    runs.append(self._dump_run(run))
+                    run, run_size = [], 0
+            run.sort(key=key)
+
+            while len(runs) > self.merge_fan_in:
+                for i in range(0, len(runs), self.merge_fan_in):
+                    group = runs[i:i + self.merge_fan_in]
+                    merged_runs.append(self._dump_run(heapq.merge(*map(_read_frames, group), key=key)))
+                    for file in group:
+                        file.close()
+                runs, merged_runs = merged_runs, []
+
+            yield from heapq.merge(*map(_read_frames, runs), run, key=key)
+        finally:
+            for file in runs + merged_runs:
+                file.close()
+
+
+class GlobalTopN(Operation):
+    """
+    Calculate top N rows by value over the whole table, keeping only N rows in a heap.
+    If workers are set, batches of rows are reduced to their own top N in worker processes
+    and these partial tops are merged into the global one
+    """
+    def __init__(self, column: str, n: int, workers: Optional[int] = None, batch_size: int = 65536) -> None:
+        """
+        :param column: column name to get top by
+        :param n: number of top values to extract
+        :param workers: number of worker processes, rows are processed in the current process if None
+        :param batch_size: number of rows sent to a worker at once
+        """
+        self.column = column
+        self.n = n
+        self._pool: Optional[_BatchPool] = None
+        if workers is not None:
+            partial_top = functools.partial(heapq.nlargest, n, key=operator.itemgetter(column))
+            self._pool = _BatchPool(partial_top, workers, batch_size, ordered=True)
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        if self.n <= 0:
+            return
+        candidates = rows if self._pool is None else itertools.chain.from_iterable(self._pool(rows))
+
+        # row index breaks ties in favour of earlier rows, as heapq.nlargest does
+        heap: list[tuple[Any, int, TRow]] = []
+        for i, row in enumerate(candidates):
+            value = row[self.column]
+            if len(heap) < self.n:
+                heapq.heappush(heap, (value, -i, row))
+            elif value > heap[0][0]:
+                heapq.heapreplace(heap, (value, -i, row))
+
+        for _, _, row in sorted(heap, reverse=True):
+            yield row
+
 
 # Dummy operators
 
@@ -164,6 +957,9 @@ class DummyMapper(Mapper):
 
 class FirstReducer(Reducer):
     """Yield only first row from passed ones"""
+    def keeps_keys(self, keys: tp.Sequence[str]) -> bool:
+        return True
+
     def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
         for row in rows:
             yield row
@@ -181,7 +977,7 @@ class FilterPunctuation(Mapper):
         self.column = column
 
     def __call__(self, row: TRow) -> TRowsGenerator:
-        row[self.column] = "".join(list(filter(lambda x: x not in string.punctuation, row[self.column])))
+        row[self.column] = text.remove_punctuation(row[self.column])
         yield row
 
 
@@ -213,11 +1009,8 @@ class Split(Mapper):
         self.separator = separator
 
     @staticmethod
-    def itersplit(text: str, sep: Optional[str]) -> Generator[str, None, None]:
-        sep = sep or r"\s+"
-        matches = re.finditer(r'\w+', text)
-        for match in matches:
-            yield match.group(0)
+    def itersplit(txt: str, sep: Optional[str]) -> Generator[str, None, None]:
+        return text.itersplit(txt, sep)
 
     def __call__(self, row: TRow) -> TRowsGenerator:
         for val in self.itersplit(row[self.column], self.separator):
@@ -226,6 +1019,32 @@ class Split(Mapper):
             yield new
 
 
+class BatchSplit(Operation):
+    """
+    Split rows on multiple rows by separator, tokenizing batches of rows in one call.
+    Faster than Map(Split(...)), but all parts of a batch are kept in memory
+    """
+    def __init__(self, column: str, separator: str | None = None, batch_size: int = 1024) -> None:
+        """
+        :param column: name of column to split
+        :param separator: string to separate by
+        :param batch_size: number of rows tokenized at once
+        """
+        self.column = column
+        self.separator = separator
+        self.batch_size = batch_size
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        column = self.column
+        rows = iter(rows)
+        while batch := list(itertools.islice(rows, self.batch_size)):
+            for row, parts in zip(batch, text.split_many((row[column] for row in batch), self.separator)):
+                for part in parts:
+                    new = row.copy()
+                    new[column] = part
+                    yield new
+
+
 class Product(Mapper):
     """Calculates product of multiple columns"""
     def __init__(self, columns: tp.Sequence[str], result_column: str = 'product') -> None:
@@ -281,27 +1100,42 @@ class TopN(Reducer):
         self.column_max = column
         self.n = n
 
+    def keeps_keys(self, keys: tp.Sequence[str]) -> bool:
+        return True
+
     def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
         yield from heapq.nlargest(self.n, rows, key=operator.itemgetter(self.column_max))
 
 
 class TermFrequency(Reducer):
     """Calculate frequency of values in column"""
-    def __init__(self, words_column: str, result_column: str = 'tf') -> None:
+    def __init__(self, words_column: str, result_column: str = 'tf', count_column: Optional[str] = None) -> None:
         """
         :param words_column: name for column with words
         :param result_column: name for result column
+        :param count_column: name for column with partial counts of words (e.g. made by CountCombiner),
+                             if not set every row counts as one occurrence
         """
         self.words_column = words_column
         self.result_column = result_column
+        self.count_column = count_column
+
+    def keeps_keys(self, keys: tp.Sequence[str]) -> bool:
+        return True
 
     def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
-        cnt: defaultdict[str, int] = defaultdict(int)
-        last: TRow = dict()
-        for row in rows:
-            cnt[row[self.words_column]] += 1
-            last = row
-        tmp = {col: val for col, val in last.items() if col in group_key}
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return
+        rows = itertools.chain((first,), rows)
+        cnt: Counter[str] = Counter()
+        if self.count_column is None:
+            cnt.update(map(operator.itemgetter(self.words_column), rows))
+        else:
+            for row in rows:
+                cnt[row[self.words_column]] += row[self.count_column]
+        tmp = {col: val for col, val in first.items() if col in group_key}
         words = sum(cnt.values())
         for col, val in cnt.items():
             row = tmp.copy()
@@ -325,6 +1159,9 @@ class Count(Reducer):
         """
         self.column = column
 
+    def keeps_keys(self, keys: tp.Sequence[str]) -> bool:
+        return len(keys) == 1  # every key of a group is output in a separate row
+
     def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
         cnt: defaultdict[str, int] = defaultdict(int)
         vals: dict[str, Any] = dict()
@@ -351,6 +1188,9 @@ class Sum(Reducer):
         """
         self.column = column
 
+    def keeps_keys(self, keys: tp.Sequence[str]) -> bool:
+        return len(keys) == 1  # every key of a group is output in a separate row
+
     def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
         sums: defaultdict[str, int] = defaultdict(int)
         vals: dict[str, Any] = dict()
@@ -362,56 +1202,205 @@ class Sum(Reducer):
             yield {self.column: value, key: vals[key]}
 
 
+# Text statistics
+
+
+class _WordStatistics(Operation):
+    """
+    Base class for operations computing statistics of words over the whole corpus.
+    Occurrences of words in documents are counted in one pass with Counter bulk updates,
+    so input doesn't need to be sorted and memory is proportional to the number of distinct (doc, word) pairs
+    """
+    def __init__(self, doc_column: str, words_column: str, result_column: str) -> None:
+        """
+        :param doc_column: name for column with document ids
+        :param words_column: name for column with words
+        :param result_column: name for result column
+        """
+        self.doc_column = doc_column
+        self.words_column = words_column
+        self.result_column = result_column
+
+    def _count_pairs(self, rows: TRowsIterable) -> Counter[tuple[Any, str]]:
+        """Number of occurrences of every word in every document"""
+        return Counter(map(operator.itemgetter(self.doc_column, self.words_column), rows))
+
+    @staticmethod
+    def _document_frequency(pairs: Counter[tuple[Any, str]]) -> Counter[str]:
+        return Counter(map(operator.itemgetter(1), pairs))
+
+    @staticmethod
+    def _totals(pairs: Counter[tuple[Any, str]], position: int) -> defaultdict[Any, int]:
+        """Number of words in every document (position=0) or occurrences of every word (position=1)"""
+        totals: defaultdict[Any, int] = defaultdict(int)
+        for pair, count in pairs.items():
+            totals[pair[position]] += count
+        return totals
+
+
+class DocumentFrequency(_WordStatistics):
+    """
+    Count documents containing each word
+    Example for doc_column='doc_id', words_column='text'
+        {'doc_id': 1, 'text': 'a'}
+        {'doc_id': 1, 'text': 'a'}
+        {'doc_id': 2, 'text': 'a'}
+        =>
+        {'text': 'a', 'df': 2}
+    """
+    def __init__(self, doc_column: str, words_column: str, result_column: str = 'df') -> None:
+        super().__init__(doc_column, words_column, result_column)
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        for word, count in self._document_frequency(self._count_pairs(rows)).items():
+            yield {self.words_column: word, self.result_column: count}
+
+
+class InverseDocumentFrequency(_WordStatistics):
+    """Calculate idf = log(number of documents / number of documents containing word) for each word"""
+    def __init__(self, doc_column: str, words_column: str, result_column: str = 'idf') -> None:
+        super().__init__(doc_column, words_column, result_column)
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        pairs = self._count_pairs(rows)
+        docs = len(self._totals(pairs, 0))
+        for word, count in self._document_frequency(pairs).items():
+            yield {self.words_column: word, self.result_column: math.log(docs / count)}
+
+
+class TfIdf(_WordStatistics):
+    """Calculate tf-idf = tf * idf for each word in each document, see TermFrequency and InverseDocumentFrequency"""
+    def __init__(self, doc_column: str, words_column: str, result_column: str = 'tf_idf') -> None:
+        super().__init__(doc_column, words_column, result_column)
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        pairs = self._count_pairs(rows)
+        doc_lengths = self._totals(pairs, 0)
+        idf = {word: math.log(len(doc_lengths) / count) for word, count in self._document_frequency(pairs).items()}
+        for (doc, word), count in pairs.items():
+            yield {self.doc_column: doc, self.words_column: word,
+                   self.result_column: count / doc_lengths[doc] * idf[word]}
+
+
+class Pmi(_WordStatistics):
+    """
+    Calculate pointwise mutual information of each word and each document
+    pmi = log(frequency of word in document / frequency of word in all documents)
+    """
+    def __init__(self, doc_column: str, words_column: str, result_column: str = 'pmi') -> None:
+        super().__init__(doc_column, words_column, result_column)
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        pairs = self._count_pairs(rows)
+        doc_lengths = self._totals(pairs, 0)
+        word_counts = self._totals(pairs, 1)
+        total = sum(doc_lengths.values())
+        for (doc, word), count in pairs.items():
+            yield {self.doc_column: doc, self.words_column: word,
+                   self.result_column: math.log(count * total / (doc_lengths[doc] * word_counts[word]))}
+
+
+# Combiners
+
+
+class SumCombiner(Combiner):
+    """
+    Partially sum values by key, result is merged by Sum reducer with the same column
+    Example for key=('a',) and column='b'
+        {'a': 1, 'b': 2, 'c': 4}
+        {'a': 1, 'b': 3, 'c': 5}
+        =>
+        {'a': 1, 'b': 5}
+    """
+    def __init__(self, column: str) -> None:
+        """
+        :param column: name for sum column
+        """
+        self.column = column
+
+    def __call__(self, group_key: tuple[str, ...], partial: Optional[TRow], row: TRow) -> TRow:
+        if partial is None:
+            partial = {key: row[key] for key in group_key}
+            partial[self.column] = row[self.column]
+        else:
+            partial[self.column] += row[self.column]
+        return partial
+
+
+class CountCombiner(Combiner):
+    """
+    Partially count records by key, result is merged by Sum reducer with the same column
+    (or by TermFrequency with count_column, if words column is a part of the key)
+    Example for key=('a',) and column='d'
+        {'a': 1, 'b': 5, 'c': 2}
+        {'a': 1, 'b': 6, 'c': 1}
+        =>
+        {'a': 1, 'd': 2}
+    """
+    def __init__(self, column: str) -> None:
+        """
+        :param column: name for count column
+        """
+        self.column = column
+
+    def __call__(self, group_key: tuple[str, ...], partial: Optional[TRow], row: TRow) -> TRow:
+        if partial is None:
+            partial = {key: row[key] for key in group_key}
+            partial[self.column] = 1
+        else:
+            partial[self.column] += 1
+        return partial
+
+
 # Joiners
 
 
 class InnerJoiner(Joiner):
     """Join with inner strategy"""
     def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:
-        cache_b = list(rows_b)
-        for a in rows_a:
-            for b in cache_b:
-                yield self._join_rows(keys, a, b)
+        with self._cache(rows_b) as cache_b:
+            for a in rows_a:
+                for b in cache_b:
+                    yield self._join_rows(keys, a, b)
 
 
 class OuterJoiner(Joiner):
     """Join with outer strategy"""
     def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:
-        cache_a = list(rows_a)
-        cache_b = list(rows_b)
-
-        if not cache_a:
-            yield from cache_b
+        with self._cache(rows_b) as cache_b:
+            if not cache_b:
+                yield from rows_a
+                return
 
-        if not cache_b:
-            yield from cache_a
+            empty_a = True
+            for a in rows_a:
+                empty_a = False
+                for b in cache_b:
+                    yield self._join_rows(keys, a, b)
 
-        for a in cache_a:
-            for b in cache_b:
-                yield self._join_rows(keys, a, b)
+            if empty_a:
+                yield from cache_b
 
 
 class LeftJoiner(Joiner):
     """Join with left strategy"""
     def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:
-        cache_b = list(rows_b)
+        with self._cache(rows_b) as cache_b:
+            if not cache_b:
+                yield from rows_a
 
-        if not cache_b:
-            yield from rows_a
-
-        for row_a in rows_a:
-            for row_b in cache_b:
-                yield self._join_rows(keys, row_a, row_b)
+            for row_a in rows_a:
+                for row_b in cache_b:
+                    yield self._join_rows(keys, row_a, row_b)
 
 
 class RightJoiner(Joiner):
     """Join with right strategy"""
     def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:
-        cache_a = list(rows_a)
-
-        if not cache_a:
-            yield from rows_b
+        with self._cache(rows_a) as cache_a:
+            if not cache_a:
+                yield from rows_b
 
-        for row_b in rows_b:
-            for row_a in cache_a:
-                yield self._join_rows(keys, row_b, row_a)
+            for row_b in rows_b:
+                for row_a in cache_a:
+                    yield self._join_rows(keys, row_b, row_a)
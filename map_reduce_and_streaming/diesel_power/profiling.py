@@ -0,0 +1,258 @@
+import dataclasses
+import itertools
+import sys
+import typing as tp
+from time import perf_counter, process_time
+
+from . import operations as ops
+from .graph import Graph
+from .memory_watchdog import SELF_PROCESS
+
+T = tp.TypeVar('T')
+
+
+@dataclasses.dataclass
+class StageStats:
+    """
+    Statistics of one instrumented stage.
+    Time of an operation doesn't include time of stages it reads from,
+    but includes time of its mapper, reducer or joiner
+    """
+    name: str
+    rows_in: int = 0
+    rows_out: int = 0
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    peak_rss: int = 0
+
+
+class _Timer:
+    """
+    Stack of timed regions: time of regions nested into a region is subtracted from its time,
+    so a stage is not charged for instrumented stages it reads from
+    """
+    def __init__(self) -> None:
+        self._nested: list[list[float]] = []  # wall and cpu time of regions nested into every open region
+
+    def call(self, func: tp.Callable[..., tp.Iterable[T]], *args: tp.Any) -> tuple[list[T], float, float]:
+        """
+        Call func and read all its rows
+        :return: rows, wall and cpu time of the call excluding nested regions
+        """
+        self._nested.append([0.0, 0.0])
+        wall, cpu = perf_counter(), process_time()
+        try:
+            rows = list(func(*args))
+        finally:
+            wall, cpu = perf_counter() - wall, process_time() - cpu
+            nested_wall, nested_cpu = self._nested.pop()
+            if self._nested:
+                self._nested[-1][0] += wall
+                self._nested[-1][1] += cpu
+        return rows, wall - nested_wall, cpu - nested_cpu
+
+
+_TIMER = _Timer()
+
+
+class _Meter:
+    """
+    Measures time spent inside of a stage excluding time spent in its inputs.
+    Operations are read in chunks and every chunk is timed. Mappers, reducers and joiners are called
+    once per row or group, so only chunks of every n-th call are timed and time of others is extrapolated.
+    RSS is sampled at every n-th row
+    """
+    def __init__(self, stats: StageStats, time_sample_every: int, rss_sample_every: int, chunk_size: int) -> None:
+        self.stats = stats
+        self.time_sample_every = time_sample_every
+        self.rss_sample_every = rss_sample_every
+        self.chunk_size = chunk_size
+        self._calls = 0
+        self._sampled_calls = 0
+        self._sampled_wall = 0.0
+        self._sampled_cpu = 0.0
+
+    def _count_output(self, rows: int) -> None:
+        stats = self.stats
+        if (stats.rows_out + rows) // self.rss_sample_every != stats.rows_out // self.rss_sample_every \
+                or not stats.peak_rss:
+            stats.peak_rss = max(stats.peak_rss, SELF_PROCESS.memory_info().rss)
+        stats.rows_out += rows
+
+    def input(self, rows: tp.Iterable[T], timed: bool) -> tp.Iterator[T]:
+        """
+        Count rows read by the stage
+        :param timed: whether time of reading is excluded from time of the stage
+        """
+        rows = iter(rows)
+        while True:
+            if timed:
+                chunk, _, _ = _TIMER.call(itertools.islice, rows, self.chunk_size)
+            else:
+                chunk = list(itertools.islice(rows, self.chunk_size))
+            if not chunk:
+                return
+            self.stats.rows_in += len(chunk)
+            yield from chunk
+
+    def output(self, rows: tp.Iterable[T]) -> tp.Iterator[T]:
+        """Time reading rows of operation by chunks"""
+        stats = self.stats
+        rows = iter(rows)
+        while True:
+            chunk, wall, cpu = _TIMER.call(itertools.islice, rows, self.chunk_size)
+            stats.wall_time += wall
+            stats.cpu_time += cpu
+            self._count_output(len(chunk))
+            if not chunk:
+                return
+            yield from chunk
+
+    def call(self, func: tp.Callable[..., tp.Iterable[T]], *args: tp.Any) -> tp.Generator[T, None, None]:
+        """Call mapper, reducer or joiner and read its rows by chunks, timing every n-th call"""
+        self._calls += 1
+        rows = iter(func(*args))
+        if self._calls % self.time_sample_every:
+            # Most calls of mappers return less than a chunk, so it's read without another generator
+            chunk = list(itertools.islice(rows, self.chunk_size))
+            self._count_output(len(chunk))
+            yield from chunk
+            if len(chunk) == self.chunk_size:
+                yield from self._read(rows, sampled=False)
+        else:
+            self._sampled_calls += 1
+            yield from self._read(rows, sampled=True)
+
+    def _read(self, rows: tp.Iterator[T], sampled: bool) -> tp.Iterator[T]:
+        stats = self.stats
+        while True:
+            if sampled:
+                chunk, wall, cpu = _TIMER.call(itertools.islice, rows, self.chunk_size)
+                self._sampled_wall += wall
+                self._sampled_cpu += cpu
+                stats.wall_time = self._sampled_wall * self._calls / self._sampled_calls
+                stats.cpu_time = self._sampled_cpu * self._calls / self._sampled_calls
+            else:
+                chunk = list(itertools.islice(rows, self.chunk_size))
+            self._count_output(len(chunk))
+            yield from chunk
+            if len(chunk) < self.chunk_size:
+                return
+
+
+class ProfiledOperation(ops.Operation):
+    """Operation wrapper collecting statistics of the wrapped operation"""
+    def __init__(self, operation: ops.Operation, meter: _Meter) -> None:
+        self.operation = operation
+        self._meter = meter
+
+    def __call__(self, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        inputs = [self._meter.input(rows, timed=True) for rows in args]
+        yield from self._meter.output(self.operation(*inputs, **kwargs))
+
+
+class ProfiledMapper(ops.Mapper):
+    """Mapper wrapper collecting statistics of the wrapped mapper"""
+    def __init__(self, mapper: ops.Mapper, meter: _Meter) -> None:
+        self.mapper = mapper
+        self._meter = meter
+
+    def __call__(self, row: ops.TRow) -> ops.TRowsGenerator:
+        self._meter.stats.rows_in += 1
+        return self._meter.call(self.mapper, row)
+
+
+class ProfiledReducer(ops.Reducer):
+    """Reducer wrapper collecting statistics of the wrapped reducer"""
+    def __init__(self, reducer: ops.Reducer, meter: _Meter) -> None:
+        self.reducer = reducer
+        self._meter = meter
+
+    def __call__(self, group_key: tuple[str, ...], rows: ops.TRowsIterable) -> ops.TRowsGenerator:
+        return self._meter.call(self.reducer, group_key, self._meter.input(rows, timed=False))
+
+
+class ProfiledJoiner(ops.Joiner):
+    """Joiner wrapper collecting statistics of the wrapped joiner"""
+    def __init__(self, joiner: ops.Joiner, meter: _Meter) -> None:
+        super().__init__()
+        self.joiner = joiner
+        self._meter = meter
+
+    def __call__(self, keys: tp.Sequence[str], rows_a: ops.TRowsIterable, rows_b: ops.TRowsIterable
+                 ) -> ops.TRowsGenerator:
+        return self._meter.call(self.joiner, keys, self._meter.input(rows_a, timed=False),
+                                self._meter.input(rows_b, timed=False))
+
+
+class Profiler:
+    """
+    Collects per-stage statistics: rows in, rows out, wall time, cpu time and peak RSS.
+    Operations, mappers, reducers and joiners are instrumented by wrapping them
+    """
+    def __init__(self, time_sample_every: int = 64, rss_sample_every: int = 4096, chunk_size: int = 256) -> None:
+        """
+        :param time_sample_every: time every n-th call of mappers, reducers and joiners (1 to time all calls)
+        :param rss_sample_every: sample process RSS at every n-th row of a stage
+        :param chunk_size: number of rows operations are read and timed by
+        """
+        self.time_sample_every = time_sample_every
+        self.rss_sample_every = rss_sample_every
+        self.chunk_size = chunk_size
+        self.stages: dict[str, StageStats] = dict()
+
+    def _meter(self, name: str) -> _Meter:
+        stats = self.stages.setdefault(name, StageStats(name))
+        return _Meter(stats, self.time_sample_every, self.rss_sample_every, self.chunk_size)
+
+    def operation(self, operation: ops.Operation, name: tp.Optional[str] = None) -> ProfiledOperation:
+        return ProfiledOperation(operation, self._meter(name or type(operation).__name__))
+
+    def mapper(self, mapper: ops.Mapper, name: tp.Optional[str] = None) -> ProfiledMapper:
+        return ProfiledMapper(mapper, self._meter(name or type(mapper).__name__))
+
+    def reducer(self, reducer: ops.Reducer, name: tp.Optional[str] = None) -> ProfiledReducer:
+        return ProfiledReducer(reducer, self._meter(name or type(reducer).__name__))
+
+    def joiner(self, joiner: ops.Joiner, name: tp.Optional[str] = None) -> ProfiledJoiner:
+        return ProfiledJoiner(joiner, self._meter(name or type(joiner).__name__))
+
+    def instrument_graph(self, graph: Graph) -> Graph:
+        """Construct graph with every operation of the optimized `graph` instrumented"""
+        counter = itertools.count(1)
+        instrumented: dict[int, Graph] = dict()
+
+        def instrument(node: Graph) -> Graph:
+            if id(node) not in instrumented:
+                parents = [instrument(parent) for parent in node.parents]
+                operation = node.operation
+                inner = getattr(operation, 'mapper', None) or getattr(operation, 'reducer', None) \
+                    or getattr(operation, 'joiner', None)
+                name = type(operation).__name__ + (f'({type(inner).__name__})' if inner is not None else '')
+                profiled = self.operation(operation, f'#{next(counter)} {name}')
+                instrumented[id(node)] = Graph(profiled, parents, node.sorted_by)
+            return instrumented[id(node)]
+
+        return instrument(graph.optimize())
+
+    def run(self, graph: Graph, report_file: tp.Optional[tp.TextIO] = None, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        """
+        Run instrumented graph and write report when it's finished
+        :param graph: graph to run
+        :param report_file: file to write report to, stderr by default
+        :param kwargs: graph data sources
+        """
+        try:
+            yield from self.instrument_graph(graph).run(**kwargs)
+        finally:
+            self.write_report(report_file or sys.stderr)
+
+    def report(self) -> str:
+        lines = [f'{"stage":<40}{"rows in":>12}{"rows out":>12}{"wall, s":>10}{"cpu, s":>10}{"peak RSS, KiB":>16}']
+        for stats in self.stages.values():
+            lines.append(f'{stats.name:<40}{stats.rows_in:>12}{stats.rows_out:>12}{stats.wall_time:>10.3f}'
+                         f'{stats.cpu_time:>10.3f}{stats.peak_rss // 1024:>16}')
+        return '\n'.join(lines)
+
+    def write_report(self, file: tp.TextIO = sys.stderr) -> None:
+        print(self.report(), file=file)
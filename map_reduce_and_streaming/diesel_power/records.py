@@ -0,0 +1,167 @@
+import functools
+import typing as tp
+
+from . import operations as ops
+
+
+class _Missing:
+    """Marker of a column which is declared in schema but not set"""
+    def __repr__(self) -> str:
+        return '<missing>'
+
+    def __reduce__(self) -> str:
+        return '_MISSING'
+
+
+_MISSING = _Missing()
+_new_object = object.__new__
+
+
+class Record(tp.MutableMapping[str, tp.Any]):
+    """
+    Row with a fixed set of columns declared by schema, values are kept in a list indexed by column position.
+    It's much smaller than dict and can be passed to mappers, reducers and joiners instead of it.
+    Columns not declared in schema can't be set. Use Schema to make records.
+    Copying a record is still about 3 times slower than copying a dict, convert records to dicts
+    with ToDicts before copy-heavy stages
+    """
+    __slots__ = ('_values',)
+    _schema: 'Schema'
+    _index: dict[str, int]
+
+    def __init__(self, *args: tp.Any, **kwargs: tp.Any) -> None:
+        """Arguments are the same as of dict"""
+        if len(args) == 1 and not kwargs and isinstance(args[0], tp.Mapping):
+            row = args[0]
+            self._values: list[tp.Any] = [row.get(col, _MISSING) for col in self._index]
+            if len(self) != len(row):
+                self.update(row)  # raise KeyError for the first undeclared column
+        else:
+            self._values = [_MISSING] * len(self._index)
+            self.update(*args, **kwargs)
+
+    @property
+    def schema(self) -> 'Schema':
+        return self._schema
+
+    def __getitem__(self, key: str) -> tp.Any:
+        value = self._values[self._index[key]]
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: tp.Any) -> None:
+        try:
+            self._values[self._index[key]] = value
+        except KeyError:
+            raise KeyError(f'Column {key!r} is not declared in schema {self._schema!r}') from None
+
+    def __delitem__(self, key: str) -> None:
+        self[key]  # raise KeyError if column is not set
+        self._values[self._index[key]] = _MISSING
+
+    def __contains__(self, key: object) -> bool:
+        index = self._index.get(key) if isinstance(key, str) else None
+        return index is not None and self._values[index] is not _MISSING
+
+    def __iter__(self) -> tp.Iterator[str]:
+        for col, value in zip(self._schema.columns, self._values):
+            if value is not _MISSING:
+                yield col
+
+    def __len__(self) -> int:
+        return len(self._values) - self._values.count(_MISSING)
+
+    def copy(self) -> 'Record':
+        """Copy values list directly, copy.copy uses it too instead of __reduce__"""
+        new = _new_object(type(self))
+        new._values = self._values.copy()
+        return new
+
+    __copy__ = copy
+
+    def __reduce__(self) -> tuple[tp.Any, ...]:
+        return _restore_record, (self._schema, self._values)
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({dict(self.items())!r})'
+
+
+def _restore_record(schema: 'Schema', values: list[tp.Any]) -> Record:
+    record = object.__new__(schema.record_type)
+    record._values = values
+    return record
+
+
+@functools.lru_cache(maxsize=None)
+def _record_type(columns: tuple[str, ...]) -> tp.Type[Record]:
+    """Record class of the schema, the same one for equal schemas"""
+    return tp.cast(tp.Type[Record], type('Record', (Record,), {
+        '__slots__': (),
+        '_schema': Schema(columns),
+        '_index': {col: i for i, col in enumerate(columns)}
+    }))
+
+
+class Schema:
+    """
+    Declared columns of rows.
+    Example:
+        schema = Schema(('doc_id', 'text'))
+        rows = schema.records(rows)  # or graph.map(ToRecords(schema))
+    """
+    def __init__(self, columns: tp.Sequence[str]) -> None:
+        """
+        :param columns: names of all the columns rows may have, including ones added by mappers
+        """
+        if len(set(columns)) != len(columns):
+            raise ValueError(f'Duplicated columns in schema: {columns}')
+        self._columns = tuple(columns)
+
+    @property
+    def columns(self) -> tuple[str, ...]:
+        return self._columns
+
+    @property
+    def record_type(self) -> tp.Type[Record]:
+        return _record_type(self._columns)
+
+    def record(self, *args: tp.Any, **kwargs: tp.Any) -> Record:
+        """Make record, arguments are the same as of dict"""
+        return self.record_type(*args, **kwargs)
+
+    def records(self, rows: tp.Iterable[tp.Mapping[str, tp.Any]]) -> tp.Generator[Record, None, None]:
+        """Convert rows to records"""
+        record_type = self.record_type
+        for row in rows:
+            yield record_type(row)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Schema) and self._columns == other._columns
+
+    def __hash__(self) -> int:
+        return hash(self._columns)
+
+    def __reduce__(self) -> tuple[tp.Any, ...]:
+        return Schema, (self._columns,)
+
+    def __repr__(self) -> str:
+        return f'Schema({self._columns!r})'
+
+
+class ToRecords(ops.Mapper):
+    """Convert row to record of schema"""
+    def __init__(self, schema: Schema) -> None:
+        """
+        :param schema: schema of records
+        """
+        self.schema = schema
+
+    def __call__(self, row: ops.TRow) -> ops.TRowsGenerator:
+        yield tp.cast(ops.TRow, self.schema.record(row))
+
+
+class ToDicts(ops.Mapper):
+    """Convert record back to dict, e.g. to write it to json"""
+    def __call__(self, row: ops.TRow) -> ops.TRowsGenerator:
+        yield dict(row)
@@ -1,13 +1,30 @@
 import copy
 import dataclasses
+import heapq
+import io
+import itertools
+import json
+import math
+import pathlib
+import pickle
+import sys
 import time
+import tracemalloc
 import typing as tp
 
+import numpy as np
 import pytest
 from pytest import approx
 
+from . import columnar
 from . import operations as ops
 from . import memory_watchdog
+from . import text
+from .bloom import BloomFilter
+from .checkpoint import Checkpointer, describe
+from .graph import Graph
+from .profiling import Profiler
+from .records import Schema
 
 
 KiB = 1024
@@ -166,6 +183,49 @@ def test_mapper(case: MapCase) -> None:
     assert sorted(case.ground_truth, key=key_func) == sorted(result, key=key_func)
 
 
+@pytest.mark.parametrize('ordered', [True, False])
+@pytest.mark.parametrize('case', [case for case in MAP_CASES if not isinstance(case.mapper, ops.Filter)])
+def test_parallel_map(case: MapCase, ordered: bool) -> None:
+    key_func = _Key(*case.cmp_keys)
+
+    result = ops.ParallelMap(case.mapper, workers=2, batch_size=2, ordered=ordered)(iter(copy.deepcopy(case.data)))
+    assert isinstance(result, tp.Iterator)
+    if ordered:
+        assert list(ops.Map(case.mapper)(iter(copy.deepcopy(case.data)))) == list(result)
+    else:
+        assert sorted(case.ground_truth, key=key_func) == sorted(result, key=key_func)
+
+
+def test_parallel_map_unpicklable_mapper() -> None:
+    with pytest.raises(pickle.PicklingError):
+        ops.ParallelMap(ops.Filter(condition=lambda row: row['f'] ^ row['g']))
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_parallel_map_worker_error(ordered: bool) -> None:
+    result = ops.ParallelMap(ops.LowerCase(column='missing'), workers=2, ordered=ordered)(iter([{'text': 'a'}]))
+    with pytest.raises(KeyError):
+        list(result)
+
+
+@pytest.mark.parametrize('separator', [None, ' ', ',', ', ', 'ab'])
+@pytest.mark.parametrize('txt', [
+    '', ' ', 'one', ' one  two\tthree\n', 'a,b,,c,', ', x, y,', 'abab cab', 'tricky\u00A0test'
+])
+def test_itersplit(txt: str, separator: tp.Optional[str]) -> None:
+    assert txt.split(separator) == list(text.itersplit(txt, separator))
+
+
+@pytest.mark.parametrize('separator', [None, 'E'])
+def test_batch_split(separator: tp.Optional[str]) -> None:
+    data = [{'test_id': i, 'text': f'HE LLO\tE{i} \n E'} for i in range(10)]
+    expected = list(ops.Map(ops.Split(column='text', separator=separator))(copy.deepcopy(data)))
+
+    result = ops.BatchSplit(column='text', separator=separator, batch_size=3)(iter(data))
+    assert isinstance(result, tp.Iterator)
+    assert expected == list(result)
+
+
 @dataclasses.dataclass
 class ReduceCase:
     reducer: ops.Reducer
@@ -362,6 +422,86 @@ def test_reducer(case: ReduceCase) -> None:
     assert sorted(case.ground_truth, key=key_func) == sorted(result, key=key_func)
 
 
+@pytest.mark.parametrize('partitions', [1, 3])
+@pytest.mark.parametrize('case', REDUCE_CASES)
+def test_partitioned_reduce(case: ReduceCase, partitions: int) -> None:
+    # Shards are yielded in any order, so rows are compared by grouping keys too
+    key_func = _Key(*case.cmp_keys, *case.reducer_keys)
+
+    result = ops.PartitionedReduce(case.reducer, case.reducer_keys, partitions=partitions, workers=2)(
+        iter(copy.deepcopy(case.data)))
+    assert isinstance(result, tp.Iterator)
+    assert sorted(case.ground_truth, key=key_func) == sorted(result, key=key_func)
+
+
+def test_partitioned_reduce_unsorted_input() -> None:
+    data = [{'word': word} for word in 'c a b a c c d b a c'.split()]
+    expected = [
+        {'word': 'a', 'count': 3}, {'word': 'b', 'count': 2}, {'word': 'c', 'count': 4}, {'word': 'd', 'count': 1}
+    ]
+
+    result = ops.PartitionedReduce(ops.Count(column='count'), ('word',), partitions=3, workers=2)(iter(data))
+    assert sorted(expected, key=_Key('word')) == sorted(result, key=_Key('word'))
+
+
+def test_partitioned_reduce_unpicklable_reducer() -> None:
+    class LocalReducer(ops.FirstReducer):
+        pass
+
+    with pytest.raises(pickle.PicklingError):
+        ops.PartitionedReduce(LocalReducer(), ('key',))
+
+
+def test_text_statistics() -> None:
+    words = [(1, 'a'), (2, 'b'), (1, 'b'), (1, 'a'), (3, 'a'), (1, 'c')]
+    data = [{'doc_id': doc_id, 'text': word, 'other': 0} for doc_id, word in words]
+    key_func = _Key('doc_id', 'text')
+
+    assert [{'text': 'a', 'df': 2}, {'text': 'b', 'df': 2}, {'text': 'c', 'df': 1}] == \
+        sorted(ops.DocumentFrequency('doc_id', 'text')(iter(data)), key=key_func)
+
+    assert [{'text': 'a', 'idf': approx(math.log(3 / 2))}, {'text': 'b', 'idf': approx(math.log(3 / 2))},
+            {'text': 'c', 'idf': approx(math.log(3))}] == \
+        sorted(ops.InverseDocumentFrequency('doc_id', 'text')(iter(data)), key=key_func)
+
+    assert [
+        {'doc_id': 1, 'text': 'a', 'tf_idf': approx(2 / 4 * math.log(3 / 2))},
+        {'doc_id': 1, 'text': 'b', 'tf_idf': approx(1 / 4 * math.log(3 / 2))},
+        {'doc_id': 1, 'text': 'c', 'tf_idf': approx(1 / 4 * math.log(3))},
+        {'doc_id': 2, 'text': 'b', 'tf_idf': approx(1 / 1 * math.log(3 / 2))},
+        {'doc_id': 3, 'text': 'a', 'tf_idf': approx(1 / 1 * math.log(3 / 2))}
+    ] == sorted(ops.TfIdf('doc_id', 'text')(iter(data)), key=key_func)
+
+    assert [
+        {'doc_id': 1, 'text': 'a', 'pmi': approx(math.log((2 / 4) / (3 / 6)))},
+        {'doc_id': 1, 'text': 'b', 'pmi': approx(math.log((1 / 4) / (2 / 6)))},
+        {'doc_id': 1, 'text': 'c', 'pmi': approx(math.log((1 / 4) / (1 / 6)))},
+        {'doc_id': 2, 'text': 'b', 'pmi': approx(math.log((1 / 1) / (2 / 6)))},
+        {'doc_id': 3, 'text': 'a', 'pmi': approx(math.log((1 / 1) / (3 / 6)))}
+    ] == sorted(ops.Pmi('doc_id', 'text')(iter(data)), key=key_func)
+
+    assert [] == list(ops.TfIdf('doc_id', 'text')(iter([])))
+
+
+@pytest.mark.parametrize('max_groups', [1, 2, 100])
+@pytest.mark.parametrize('combiner, reducer, reducer_keys, combiner_keys, case', [
+    (ops.SumCombiner(column='score'), ops.Sum(column='score'), ('match_id',), ('match_id',), REDUCE_CASES[5]),
+    (ops.CountCombiner(column='count'), ops.Sum(column='count'), ('word',), ('word',), REDUCE_CASES[4]),
+    (ops.CountCombiner(column='count'), ops.TermFrequency(words_column='text', count_column='count'),
+     ('doc_id',), ('doc_id', 'text'), REDUCE_CASES[3]),
+])
+def test_combine(combiner: ops.Combiner, reducer: ops.Reducer, reducer_keys: tuple[str, ...],
+                 combiner_keys: tuple[str, ...], case: ReduceCase, max_groups: int) -> None:
+    key_func = _Key(*case.cmp_keys)
+
+    combined = list(ops.Combine(combiner, combiner_keys, max_groups=max_groups)(iter(copy.deepcopy(case.data))))
+    if max_groups == 100:
+        assert len(combined) == len({tuple(row[key] for key in combiner_keys) for row in case.data})
+
+    result = ops.Reduce(reducer, reducer_keys)(ops.Sort(reducer_keys)(iter(combined)))
+    assert sorted(case.ground_truth, key=key_func) == sorted(result, key=key_func)
+
+
 @dataclasses.dataclass
 class JoinCase:
     joiner: ops.Joiner
@@ -575,6 +715,633 @@ def test_joiner(case: JoinCase) -> None:
     assert sorted(case.ground_truth, key=key_func) == sorted(result, key=key_func)
 
 
+@pytest.mark.parametrize('strategy', ['hash', 'auto'])
+@pytest.mark.parametrize('case', JOIN_CASES)
+def test_hash_join(case: JoinCase, strategy: str) -> None:
+    key_func = _Key(*case.cmp_keys)
+
+    # Hash join does not require tables to be sorted
+    data_left = list(reversed(case.data_left))
+    data_right = list(reversed(case.data_right))
+
+    result = ops.Join(case.joiner, case.join_keys, strategy=strategy)(iter(data_left), iter(data_right))
+    assert isinstance(result, tp.Iterator)
+    assert sorted(case.ground_truth, key=key_func) == sorted(result, key=key_func)
+
+
+@pytest.mark.parametrize('case', JOIN_CASES)
+def test_auto_join_falls_back_to_merge(case: JoinCase) -> None:
+    key_func = _Key(*case.cmp_keys)
+
+    result = ops.Join(case.joiner, case.join_keys, strategy='auto', hash_join_threshold=1)(
+        iter(case.data_left), iter(case.data_right))
+    assert sorted(case.ground_truth, key=key_func) == sorted(result, key=key_func)
+
+    # Unsorted tables are sorted before merge join
+    result = ops.Join(case.joiner, case.join_keys, strategy='auto', hash_join_threshold=1)(
+        reversed(case.data_left), reversed(case.data_right))
+    assert sorted(case.ground_truth, key=key_func) == sorted(result, key=key_func)
+
+
+@pytest.mark.parametrize('case', JOIN_CASES)
+def test_join_spill(case: JoinCase) -> None:
+    key_func = _Key(*case.cmp_keys)
+
+    joiner = copy.copy(case.joiner)
+    joiner.spill_threshold = 1  # every key group with two or more rows goes to disk
+
+    result = ops.Join(joiner, case.join_keys)(iter(case.data_left), iter(case.data_right))
+    assert sorted(case.ground_truth, key=key_func) == sorted(result, key=key_func)
+
+
+def test_bloom_filter() -> None:
+    bloom_filter = BloomFilter(1000, false_positive_rate=0.05)
+    for i in range(1000):
+        bloom_filter.add(('key', i))
+    assert all(('key', i) in bloom_filter for i in range(1000))
+    assert sum(('key', i) in bloom_filter for i in range(1000, 11000)) < 0.1 * 10000
+
+    with pytest.raises(ValueError):
+        BloomFilter(1000, false_positive_rate=1)
+
+
+@pytest.mark.parametrize('case', JOIN_CASES)
+def test_semi_join_filter(case: JoinCase) -> None:
+    key_func = _Key(*case.cmp_keys)
+
+    # Only rows whose unmatched ones are not output by joiner may be filtered
+    data_left, data_right = case.data_left, case.data_right
+    if isinstance(case.joiner, (ops.InnerJoiner, ops.RightJoiner)):
+        data_left = list(ops.SemiJoinFilter(case.join_keys)(iter(case.data_left), iter(case.data_right)))
+    if isinstance(case.joiner, (ops.InnerJoiner, ops.LeftJoiner)):
+        data_right = list(ops.SemiJoinFilter(case.join_keys)(iter(case.data_right), iter(case.data_left)))
+
+    result = ops.Join(case.joiner, case.join_keys)(iter(data_left), iter(data_right))
+    assert sorted(case.ground_truth, key=key_func) == sorted(result, key=key_func)
+
+
+def test_semi_join_filter_drops_rows() -> None:
+    facts = [{'id': i % 1000, 'value': i} for i in range(10000)]
+    dimension = [{'id': i * 100} for i in range(10)]
+
+    result = list(ops.SemiJoinFilter(('id',), false_positive_rate=0.01)(iter(facts), iter(dimension)))
+    assert [row for row in facts if row['id'] % 100 == 0] == [row for row in result if row['id'] % 100 == 0]
+    assert len(result) < 100 + 0.05 * len(facts)
+
+    with pytest.raises(ValueError):
+        ops.SemiJoinFilter(('id',), false_positive_rate=0)
+
+
+def test_join_unknown_strategy() -> None:
+    with pytest.raises(ValueError):
+        ops.Join(ops.InnerJoiner(), ('key',), strategy='nested_loop')
+
+
+def _schema_of(*tables: list[ops.TRow]) -> Schema:
+    return Schema(list(dict.fromkeys(col for table in tables for row in table for col in row)))
+
+
+def test_record() -> None:
+    schema = Schema(('id', 'text', 'count'))
+    record = schema.record({'text': 'hello'}, id=1)
+    assert isinstance(record, tp.MutableMapping)
+    assert record == {'id': 1, 'text': 'hello'}
+    assert list(record) == ['id', 'text'] and len(record) == 2
+    assert 'count' not in record and record.get('count') is None
+
+    new = record.copy()
+    new['count'] = 2
+    del new['text']
+    assert new == {'id': 1, 'count': 2} and record == {'id': 1, 'text': 'hello'}
+    shallow = copy.copy(record)
+    shallow['count'] = 3
+    assert type(shallow) is type(record) and 'count' not in record
+
+    with pytest.raises(KeyError):
+        record['undeclared'] = 1
+    with pytest.raises(KeyError):
+        schema.record({'undeclared': 1})
+    with pytest.raises(ValueError):
+        Schema(('id', 'id'))
+
+    restored = pickle.loads(pickle.dumps(new))
+    assert type(restored) is type(new) and restored == new
+
+
+@pytest.mark.parametrize('case', MAP_CASES)
+def test_records_mapper(case: MapCase) -> None:
+    key_func = _Key(*case.cmp_keys)
+
+    schema = _schema_of(case.data, case.ground_truth)
+    result = ops.Map(case.mapper)(tp.cast(ops.TRowsIterable, schema.records(copy.deepcopy(case.data))))
+    assert sorted(case.ground_truth, key=key_func) == sorted(result, key=key_func)
+
+
+@pytest.mark.parametrize('case', REDUCE_CASES)
+def test_records_reducer(case: ReduceCase) -> None:
+    key_func = _Key(*case.cmp_keys)
+
+    schema = _schema_of(case.data)
+    result = ops.Reduce(case.reducer, case.reducer_keys)(tp.cast(ops.TRowsIterable, schema.records(case.data)))
+    assert sorted(case.ground_truth, key=key_func) == sorted(result, key=key_func)
+
+
+@pytest.mark.parametrize('case', JOIN_CASES)
+def test_records_joiner(case: JoinCase) -> None:
+    key_func = _Key(*case.cmp_keys)
+
+    left = tp.cast(ops.TRowsIterable, _schema_of(case.data_left).records(case.data_left))
+    right = tp.cast(ops.TRowsIterable, _schema_of(case.data_right).records(case.data_right))
+    result = ops.Join(case.joiner, case.join_keys)(left, right)
+    assert sorted(case.ground_truth, key=key_func) == sorted(result, key=key_func)
+
+
+def _write_lines(path: pathlib.Path, data: list[ops.TRow]) -> str:
+    path.write_text(''.join(json.dumps(row) + '\n' for row in data))
+    return str(path)
+
+
+@pytest.mark.parametrize('encoding', ['utf-8', None])
+def test_read_mmap(tmp_path: pathlib.Path, encoding: tp.Optional[str]) -> None:
+    data = [{'id': i, 'text': 'слово ' * i} for i in range(20)]
+    filename = _write_lines(tmp_path / 'rows.txt', data)
+
+    result = ops.ReadMmap(filename, json.loads, encoding=encoding)()
+    assert isinstance(result, tp.Iterator)
+    assert list(ops.Read(filename, json.loads)()) == list(result)
+
+
+@pytest.mark.parametrize('block_size', [7, 1 << 20])
+@pytest.mark.parametrize('parts', [1, 2, 3, 7, 100, 5000])
+def test_read_mmap_ranges(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch, parts: int, block_size: int) -> None:
+    monkeypatch.setattr(ops.ReadMmap, 'BLOCK_SIZE', block_size)
+    data = [{'id': i, 'text': 'x' * (i % 5)} for i in range(50)]
+    filename = _write_lines(tmp_path / 'rows.txt', data)
+
+    result: list[ops.TRow] = []
+    for start, end in ops.ReadMmap.split_ranges(filename, parts):
+        result.extend(ops.ReadMmap(filename, json.loads, start=start, end=end)())
+    assert data == result
+
+
+def test_read_mmap_empty_file(tmp_path: pathlib.Path) -> None:
+    filename = _write_lines(tmp_path / 'rows.txt', [])
+    assert [] == list(ops.ReadMmap(filename, json.loads)())
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 1024])
+def test_binary_format(tmp_path: pathlib.Path, chunk_size: int) -> None:
+    data = [{'id': i, 'text': f'row {i}', 'value': i / 3, 'tags': ['a', 'b'][:i % 3]} for i in range(10)]
+    filename = str(tmp_path / 'rows.bin')
+
+    written = ops.WriteBinary(filename, chunk_size=chunk_size)(iter(data))
+    assert isinstance(written, tp.Iterator)
+    assert data == list(written)
+
+    result = ops.ReadBinary(filename)()
+    assert isinstance(result, tp.Iterator)
+    assert data == list(result)
+
+
+def test_binary_format_interrupted(tmp_path: pathlib.Path) -> None:
+    data = [{'id': i} for i in range(10)]
+    filename = tmp_path / 'rows.bin'
+
+    written = ops.WriteBinary(str(filename), chunk_size=2)(iter(data))
+    assert data[:3] == list(itertools.islice(written, 3))
+    written.close()
+    assert [] == list(tmp_path.iterdir())
+
+    assert data == list(ops.WriteBinary(str(filename), chunk_size=2)(iter(data)))
+    assert [filename] == list(tmp_path.iterdir())
+
+
+def test_binary_format_bad_file(tmp_path: pathlib.Path) -> None:
+    filename = tmp_path / 'rows.txt'
+    filename.write_text('{"id": 1}\n')
+    with pytest.raises(ValueError):
+        list(ops.ReadBinary(str(filename))())
+
+
+@pytest.mark.parametrize('suffix', ['.txt', '.gz', '.bz2', '.xz'])
+@pytest.mark.parametrize('chunk_size', [1, 3, 1024])
+def test_source_sink(tmp_path: pathlib.Path, suffix: str, chunk_size: int) -> None:
+    data = [{'id': i, 'text': f'row {i}'} for i in range(10)]
+    filename = str(tmp_path / ('rows' + suffix))
+
+    written = ops.Sink(filename, chunk_size=chunk_size, queue_size=1)(iter(copy.deepcopy(data)))
+    assert isinstance(written, tp.Iterator)
+    passed = []
+    for row in written:
+        passed.append(copy.deepcopy(row))
+        row['text'] = ''  # rows changed further don't affect written ones
+    assert data == passed
+
+    result = ops.Source(filename, json.loads, chunk_size=chunk_size, queue_size=1)()
+    assert isinstance(result, tp.Iterator)
+    assert data == list(result)
+
+
+def test_source_errors(tmp_path: pathlib.Path) -> None:
+    filename = _write_lines(tmp_path / 'rows.txt', [{'id': i} for i in range(100)])
+
+    with pytest.raises(ValueError):
+        list(ops.Source(filename, lambda line: json.loads(line) if line != '{"id": 50}\n' else json.loads(''))())
+    with pytest.raises(FileNotFoundError):
+        list(ops.Source(str(tmp_path / 'missing.txt'), json.loads)())
+    with pytest.raises(ValueError):
+        list(ops.Source(filename, json.loads, compression='rar')())
+
+    # Reading thread is stopped when rows are not read till the end
+    result = ops.Source(filename, json.loads, chunk_size=1, queue_size=1)()
+    assert {'id': 0} == next(result)
+    result.close()
+
+
+def test_sink_errors(tmp_path: pathlib.Path) -> None:
+    with pytest.raises(FileNotFoundError):
+        list(ops.Sink(str(tmp_path / 'missing' / 'rows.txt'), chunk_size=1, queue_size=1)(iter([{'id': 1}] * 10)))
+
+
+@pytest.mark.parametrize('memory_limit, merge_fan_in', [
+    (64 * MiB, 64),  # all rows fit in memory
+    (1 * KiB, 64),  # rows are spilled to several runs
+    (1 * KiB, 2),  # runs are merged in several passes
+])
+def test_sort(memory_limit: int, merge_fan_in: int) -> None:
+    data = [{'a': i % 3, 'b': i % 5, 'value': i} for i in range(1000)]
+    ground_truth = sorted(data, key=lambda row: (row['b'], row['a']))
+
+    result = ops.Sort(('b', 'a'), memory_limit=memory_limit, merge_fan_in=merge_fan_in)(iter(data))
+    assert isinstance(result, tp.Iterator)
+    assert ground_truth == list(result)
+
+
+def test_sort_errors() -> None:
+    with pytest.raises(ValueError):
+        ops.Sort(('a',), merge_fan_in=1)
+
+    def failing_rows() -> ops.TRowsGenerator:
+        for i in range(1000):
+            yield {'a': i}
+        raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        list(ops.Sort(('a',), memory_limit=1 * KiB, merge_fan_in=2)(failing_rows()))
+
+
+def test_graph_word_count() -> None:
+    docs = [
+        {'doc_id': 1, 'text': 'hello, my little WORLD'},
+        {'doc_id': 2, 'text': 'Hello, my little little hell'}
+    ]
+    ground_truth = [
+        {'count': 1, 'text': 'hell'},
+        {'count': 1, 'text': 'world'},
+        {'count': 2, 'text': 'hello'},
+        {'count': 2, 'text': 'my'},
+        {'count': 3, 'text': 'little'}
+    ]
+
+    graph = Graph.graph_from_iter('docs') \
+        .map(ops.FilterPunctuation('text')) \
+        .map(ops.LowerCase('text')) \
+        .map(ops.Split('text')) \
+        .sort(('text',)) \
+        .reduce(ops.Count('count'), ('text',))
+
+    result = graph.run(docs=lambda: iter(copy.deepcopy(docs)))
+    assert sorted(ground_truth, key=_Key('count', 'text')) == sorted(result, key=_Key('count', 'text'))
+
+
+def test_graph_join() -> None:
+    players = [{'player_id': 2, 'username': 'jay'}, {'player_id': 1, 'username': 'XeroX'}]
+    games = [{'game_id': 1, 'player_id': 1, 'score': 17}, {'game_id': 2, 'player_id': 2, 'score': 22}]
+    ground_truth = [
+        {'game_id': 1, 'player_id': 1, 'score': 17, 'username': 'XeroX'},
+        {'game_id': 2, 'player_id': 2, 'score': 22, 'username': 'jay'}
+    ]
+
+    players_graph = Graph.graph_from_iter('players').sort(('player_id',))
+    games_graph = Graph.graph_from_iter('games').sort(('player_id',))
+    graph = games_graph.join(ops.InnerJoiner(), players_graph, ('player_id',))
+
+    result = graph.run(players=lambda: iter(players), games=lambda: iter(games))
+    assert ground_truth == sorted(result, key=_Key('game_id'))
+
+
+def test_graph_semi_join() -> None:
+    players = [{'player_id': 2, 'username': 'jay'}, {'player_id': 1, 'username': 'XeroX'}]
+    games = [{'game_id': i, 'player_id': i % 10, 'score': i} for i in range(30)]
+
+    players_graph = Graph.graph_from_iter('players').sort(('player_id',))
+    games_graph = Graph.graph_from_iter('games').semi_join(players_graph, ('player_id',)).sort(('player_id',))
+    graph = games_graph.join(ops.InnerJoiner(), players_graph, ('player_id',))
+
+    ground_truth = Graph.graph_from_iter('games').sort(('player_id',)) \
+        .join(ops.InnerJoiner(), players_graph, ('player_id',)) \
+        .run(players=lambda: iter(players), games=lambda: iter(games))
+    result = graph.run(players=lambda: iter(players), games=lambda: iter(games))
+    assert sorted(ground_truth, key=_Key('game_id')) == sorted(result, key=_Key('game_id'))
+
+
+def test_graph_keeps_sort_after_reduce() -> None:
+    rows = [{'a': 1, 'b': 2}, {'a': 2, 'b': 1}]
+
+    # Count yields separate rows for every key of a group, so the output is not sorted by ('a', 'b')
+    graph = Graph.graph_from_iter('rows') \
+        .sort(('a', 'b')) \
+        .reduce(ops.Count('count'), ('a', 'b')) \
+        .sort(('a', 'b'))
+    assert isinstance(graph.optimize().operation, ops.Sort)
+
+    graph = Graph.graph_from_iter('rows') \
+        .sort(('a',)) \
+        .reduce(ops.Count('count'), ('a',)) \
+        .sort(('a',))
+    assert isinstance(graph.optimize().operation, ops.Reduce)
+    assert [{'count': 1, 'a': 1}, {'count': 1, 'a': 2}] == list(graph.run(rows=lambda: iter(rows)))
+
+
+def test_graph_skips_redundant_sort() -> None:
+    graph = Graph.graph_from_iter('rows') \
+        .sort(('a', 'b')) \
+        .map(ops.Filter(lambda row: row['a'] > 0)) \
+        .sort(('a',))
+
+    optimized = graph.optimize()
+    assert isinstance(optimized.operation, ops.Map)
+    assert isinstance(optimized.parents[0].operation, ops.Sort)
+
+    unsorted_graph = Graph.graph_from_iter('rows').map(ops.DummyMapper()).sort(('a',))
+    assert isinstance(unsorted_graph.optimize().operation, ops.Sort)
+
+    rows = [{'a': 2, 'b': 1}, {'a': 1, 'b': 2}, {'a': 1, 'b': 1}]
+    assert [{'a': 1, 'b': 1}, {'a': 1, 'b': 2}, {'a': 2, 'b': 1}] == list(graph.run(rows=lambda: iter(rows)))
+
+
+def test_columnar_map_operations() -> None:
+    data = [{'test_id': i, 'speed': i % 7, 'distance': 0.5 * i, 'name': f'car_{i}'} for i in range(100)]
+
+    rows_result = ops.Map(ops.Filter(lambda row: row['speed'] > 2))(copy.deepcopy(data))
+    rows_result = ops.Map(ops.Product(['speed', 'distance'], result_column='time'))(rows_result)
+    rows_result = ops.Map(ops.Project(['name', 'time']))(rows_result)
+
+    batches = columnar.ToBatches(batch_size=16)(iter(data))
+    batches = columnar.Filter(lambda batch: np.asarray(batch['speed']) > 2)(batches)
+    batches = columnar.Product(['speed', 'distance'], result_column='time')(batches)
+    batches = columnar.Project(['name', 'time'])(batches)
+    result = columnar.ToRows()(batches)
+
+    assert isinstance(result, tp.Iterator)
+    assert list(rows_result) == list(result)
+
+
+@pytest.mark.parametrize('batch_size', [1, 3, 100])
+def test_columnar_aggregations(batch_size: int) -> None:
+    data: list[ops.TRow] = [
+        {'match_id': 1, 'player_id': 1, 'score': 42},
+        {'match_id': 2, 'player_id': 5, 'score': 15},
+        {'match_id': 1, 'player_id': 2, 'score': 7},
+        {'match_id': 2, 'player_id': 6, 'score': 39},
+        {'match_id': 1, 'player_id': 3, 'score': 0.5},
+    ]
+    key_func = _Key('match_id', 'player_id')
+
+    sums = columnar.Sum('score', ('match_id',))(columnar.ToBatches(batch_size)(iter(data)))
+    assert [{'match_id': 1, 'score': 49.5}, {'match_id': 2, 'score': 54}] == \
+        sorted(columnar.ToRows()(sums), key=key_func)
+
+    counts = columnar.Count('count', ('match_id', 'player_id'))(columnar.ToBatches(batch_size)(iter(data + data)))
+    assert [{'match_id': row['match_id'], 'player_id': row['player_id'], 'count': 2}
+            for row in sorted(data, key=key_func)] == sorted(columnar.ToRows()(counts), key=key_func)
+
+
+@pytest.mark.parametrize('workers', [None, 2])
+@pytest.mark.parametrize('n', [0, 1, 10, 1000])
+def test_global_top_n(n: int, workers: tp.Optional[int]) -> None:
+    data = [{'id': i, 'rank': (i * 7919) % 101} for i in range(500)]
+    ground_truth = heapq.nlargest(n, data, key=lambda row: row['rank'])
+
+    result = ops.GlobalTopN(column='rank', n=n, workers=workers, batch_size=64)(iter(data))
+    assert isinstance(result, tp.Iterator)
+    assert ground_truth == list(result)
+
+
+@pytest.mark.parametrize('time_sample_every', [1, 3])
+def test_profiler(time_sample_every: int) -> None:
+    docs = [{'doc_id': i, 'text': 'a b c ' * i} for i in range(10)]
+    profiler = Profiler(time_sample_every=time_sample_every, rss_sample_every=2)
+
+    graph = Graph.graph_from_iter('docs') \
+        .map(profiler.mapper(ops.Split('text'), name='split')) \
+        .sort(('text',)) \
+        .reduce(profiler.reducer(ops.Count('count'), name='count'), ('text',))
+
+    report = io.StringIO()
+    result = profiler.run(graph, report_file=report, docs=lambda: iter(docs))
+    assert [{'count': 45, 'text': 'a'}, {'count': 45, 'text': 'b'}, {'count': 45, 'text': 'c'}] == list(result)
+
+    stages = list(profiler.stages.values())
+    assert ['split', 'count', '#1 ReadIterFactory', '#2 Map(ProfiledMapper)', '#3 Sort', '#4 Reduce(ProfiledReducer)'] \
+        == [stats.name for stats in stages]
+    assert [(10, 135), (135, 3), (0, 10), (10, 135), (135, 135), (135, 3)] == \
+        [(stats.rows_in, stats.rows_out) for stats in stages]
+    assert all(stats.wall_time >= 0 and stats.cpu_time >= 0 and stats.peak_rss > 0 for stats in stages)
+    for stats in stages:
+        assert stats.name in report.getvalue()
+
+
+@pytest.mark.parametrize('time_sample_every', [1, 2])
+def test_profiler_streams_joiner(time_sample_every: int) -> None:
+    # Cross product of a hot key is streamed by chunks, not collected before the first row
+    profiler = Profiler(time_sample_every=time_sample_every)
+    join = ops.Join(profiler.joiner(ops.InnerJoiner(), name='join'), ('key',))
+    tracemalloc.start()
+    try:
+        result = join(({'key': 1, 'a': i} for i in range(1000)), ({'key': 1, 'b': i} for i in range(1000)))
+        assert {'key': 1, 'a': 0, 'b': 0} == next(result)
+        assert tracemalloc.get_traced_memory()[1] < 2 * MiB
+    finally:
+        tracemalloc.stop()
+    assert 10 ** 6 == 1 + sum(1 for _ in result)
+    assert (2000, 10 ** 6) == (profiler.stages['join'].rows_in, profiler.stages['join'].rows_out)
+
+
+class _CrashingMapper(ops.Mapper):
+    """Emulates a job failing at the last stage while `crash` is set"""
+    crash = True
+
+    def __call__(self, row: ops.TRow) -> ops.TRowsGenerator:
+        if self.crash:
+            raise RuntimeError('Job failed')
+        yield row
+
+
+def test_checkpointer(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    docs = [{'doc_id': 1, 'text': 'hello, little world'}, {'doc_id': 2, 'text': 'little hello'}]
+    filename = _write_lines(tmp_path / 'docs.txt', docs)
+    cache_dir = str(tmp_path / 'cache')
+
+    graph = Graph.graph_from_file(filename, json.loads) \
+        .map(ops.FilterPunctuation('text')) \
+        .map(ops.Split('text')) \
+        .sort(('text',)) \
+        .reduce(ops.Count('count'), ('text',)) \
+        .map(_CrashingMapper())
+
+    # Stages are Map, Map, Sort, Reduce and Map, only the first three are completed before the crash
+    checkpointer = Checkpointer(cache_dir)
+    with pytest.raises(RuntimeError):
+        list(checkpointer.run(graph))
+    assert (0, 3) == (len(checkpointer.reused), len(checkpointer.written))
+
+    monkeypatch.setattr(_CrashingMapper, 'crash', False)
+    checkpointer = Checkpointer(cache_dir)
+    ground_truth = [{'count': 2, 'text': 'hello'}, {'count': 2, 'text': 'little'}, {'count': 1, 'text': 'world'}]
+    assert ground_truth == list(checkpointer.run(graph))
+    assert (1, 2) == (len(checkpointer.reused), len(checkpointer.written))
+
+    # Only the last stage is read, the stages before it are not run at all
+    checkpointer = Checkpointer(cache_dir)
+    assert ground_truth == list(checkpointer.run(graph))
+    assert (1, 0) == (len(checkpointer.reused), len(checkpointer.written))
+
+    # Changed input invalidates every stage
+    _write_lines(tmp_path / 'docs.txt', docs + [{'doc_id': 3, 'text': 'world'}])
+    checkpointer = Checkpointer(cache_dir)
+    assert ground_truth[:2] + [{'count': 2, 'text': 'world'}] == list(checkpointer.run(graph))
+    assert (0, 5) == (len(checkpointer.reused), len(checkpointer.written))
+
+    # So does changed config
+    checkpointer = Checkpointer(cache_dir)
+    list(checkpointer.run(graph.map(ops.Filter(lambda row: row['count'] > 1))))
+    assert (1, 1) == (len(checkpointer.reused), len(checkpointer.written))
+
+
+def test_checkpointer_fan_out(tmp_path: pathlib.Path) -> None:
+    rows = [{'key': 1, 'value': 'a'}, {'key': 2, 'value': 'b'}, {'key': 1, 'value': 'c'}]
+    filename = _write_lines(tmp_path / 'rows.txt', rows)
+
+    base = Graph.graph_from_file(filename, json.loads).sort(('key',))
+    counts = base.reduce(ops.Count('count'), ('key',))
+    graph = base.map(ops.Project(('key', 'value'))).join(ops.InnerJoiner(), counts, ('key',))
+
+    # Both consumers of the sorted table compute and write it concurrently
+    ground_truth = [{'key': 1, 'value': 'a', 'count': 2}, {'key': 1, 'value': 'c', 'count': 2},
+                    {'key': 2, 'value': 'b', 'count': 1}]
+    assert ground_truth == list(Checkpointer(str(tmp_path / 'cache')).run(graph))
+    checkpointer = Checkpointer(str(tmp_path / 'cache'))
+    assert ground_truth == list(checkpointer.run(graph))
+    assert 1 == len(checkpointer.reused) and [] == checkpointer.written
+    assert not list(tmp_path.glob('cache/*.tmp'))
+
+
+def test_describe() -> None:
+    def is_nested(row: ops.TRow) -> bool:
+        return isinstance(row, dict) and all(map(is_nested, row.values()))
+
+    assert describe(ops.Filter(is_nested)) == describe(ops.Filter(is_nested))
+    module = math
+    assert 'module(math)' in describe(ops.Filter(lambda row: module.isfinite(row['x'])))
+    # repr of object contains its address
+    marker = object()
+    with pytest.raises(TypeError):
+        describe(ops.Filter(lambda row: row is marker))
+
+
+_COUNT_LIMIT = 1
+
+
+def _count_above(limit: int) -> tp.Callable[[ops.TRow], bool]:
+    def condition(row: ops.TRow, limit: int = limit) -> bool:
+        return bool(row['count'] > limit)
+    return condition
+
+
+def test_checkpointer_function_defaults_and_globals(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    assert describe(ops.Filter(_count_above(1))) != describe(ops.Filter(_count_above(100)))
+
+    rows = [{'count': 1}, {'count': 2}, {'count': 3}]
+    filename = _write_lines(tmp_path / 'rows.txt', rows)
+    graph = Graph.graph_from_file(filename, json.loads).map(ops.Filter(lambda row: row['count'] > _COUNT_LIMIT))
+    cache_dir = str(tmp_path / 'cache')
+    assert rows[1:] == list(Checkpointer(cache_dir).run(graph))
+
+    # Changed global read by the lambda invalidates the stage
+    monkeypatch.setattr(sys.modules[__name__], '_COUNT_LIMIT', 2)
+    checkpointer = Checkpointer(cache_dir)
+    assert rows[2:] == list(checkpointer.run(graph))
+    assert (0, 1) == (len(checkpointer.reused), len(checkpointer.written))
+
+
+def test_checkpointer_skips_iterator_sources(tmp_path: pathlib.Path) -> None:
+    graph = Graph.graph_from_iter('docs').map(ops.Split('text'))
+
+    checkpointer = Checkpointer(str(tmp_path))
+    assert [{'text': 'a'}, {'text': 'b'}] == list(checkpointer.run(graph, docs=lambda: iter([{'text': 'a b'}])))
+    assert ([], []) == (checkpointer.reused, checkpointer.written)
+
+
+def _allocate_table() -> list[ops.TRow]:
+    table = [{'id': i, 'text': f'row {i}'} for i in range(20000)]
+    time.sleep(0.3)  # Some sleep for watchdog catch the memory change
+    return table
+
+
+def test_watch_memory() -> None:
+    with memory_watchdog.watch_memory(limit=100 * MiB, top_sites=3) as watchdog:
+        table = _allocate_table()
+    del table
+
+    assert watchdog.maximum_memory_usage > 0
+    sites = watchdog.top_allocation_sites()
+    assert 0 < len(sites) <= 3
+    assert any(site.traceback[0].filename == __file__ for site in sites)
+    report = io.StringIO()
+    watchdog.report_top_sites(report)
+    assert 'Top allocation sites' in report.getvalue() and __file__ in report.getvalue()
+    # Snapshot is taken when the table is allocated, not at start
+    assert sites[0].traceback[0].filename == __file__ and sites[0].size > MiB
+
+
+def test_watch_memory_decorator() -> None:
+    watcher = memory_watchdog.watch_memory(limit=100 * MiB, trace_allocations=False)
+    assert 20000 == len(watcher(_allocate_table)())
+    assert watcher.watchdog is not None and watcher.watchdog.maximum_memory_usage > 0
+    assert [] == watcher.watchdog.top_allocation_sites()
+
+
+def test_watch_memory_large_heap() -> None:
+    def build() -> float:
+        start = time.perf_counter()
+        table = [{'id': i, 'text': str(i)} for i in range(300000)]
+        assert len(table) == 300000
+        return time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        traced = build()
+    finally:
+        tracemalloc.stop()
+
+    start = time.perf_counter()
+    with memory_watchdog.watch_memory(limit=1024 * MiB) as watchdog:
+        build()
+    # Snapshots of the growing heap are throttled and the report is made when tracing is stopped
+    assert time.perf_counter() - start < 3 * traced + 1
+    assert watchdog.top_allocation_sites()[0].traceback[0].filename == __file__
+
+
+def test_watch_memory_nested() -> None:
+    watcher = memory_watchdog.watch_memory(limit=100 * MiB)
+    with watcher as outer:
+        with watcher as inner:
+            assert watcher.watchdog is inner and tracemalloc.is_tracing()
+        assert tracemalloc.is_tracing() and not inner.is_alive() and outer.is_alive()
+    assert not tracemalloc.is_tracing() and not outer.is_alive()
+
+
 # ########## HEAVY TESTS WITH MEMORY TRACKING ##########
 
 
@@ -656,6 +1423,33 @@ def test_heavy_join(func_joiner: ops.Joiner, additional_memory: int, baseline_me
     run_and_track_memory(lambda: next(op), baseline_memory + additional_memory)
 
 
+@pytest.mark.parametrize('func_joiner', [
+    ops.InnerJoiner(spill_threshold=1000),
+    ops.OuterJoiner(spill_threshold=1000),
+    ops.LeftJoiner(spill_threshold=1000),
+    ops.RightJoiner(spill_threshold=1000)
+])
+def test_heavy_join_spill(func_joiner: ops.Joiner, baseline_memory: int) -> None:
+    op = ops.Join(func_joiner, ('key', ))(get_reduce_data(), get_reduce_data())
+    run_and_track_memory(lambda: next(op), baseline_memory + 5 * MiB)
+
+
+def test_heavy_global_top_n(baseline_memory: int) -> None:
+    op = ops.GlobalTopN(column='value', n=1000)(get_reduce_data())
+    run_and_track_memory(lambda: next(op), baseline_memory + 1 * MiB)
+
+
+def get_sort_data() -> tp.Generator[dict[str, tp.Any], None, None]:
+    time.sleep(0.1)  # Some sleep for watchdog catch the memory change
+    for i in range(500000):
+        yield {'key': i % 1000, 'value': i}
+
+
+def test_heavy_sort(baseline_memory: int) -> None:
+    op = ops.Sort(('key', ), memory_limit=1 * MiB)(get_sort_data())
+    run_and_track_memory(lambda: next(op), baseline_memory + 5 * MiB)
+
+
 def get_complexity_join_data() -> tp.Generator[dict[str, tp.Any], None, None]:
     for n in range(100500):
         yield {'key': n, 'value': n}
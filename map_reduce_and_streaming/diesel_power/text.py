@@ -0,0 +1,46 @@
+import functools
+import re
+import string
+import typing as tp
+
+PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+
+
+@functools.lru_cache(maxsize=None)
+def separator_pattern(separator: tp.Optional[str]) -> re.Pattern[str]:
+    """
+    Compiled pattern matching separators (runs of whitespaces if separator is None)
+    :param separator: string to separate by
+    """
+    return re.compile(r'\s+' if separator is None else re.escape(separator))
+
+
+def remove_punctuation(text: str) -> str:
+    return text.translate(PUNCTUATION_TABLE)
+
+
+def itersplit(text: str, separator: tp.Optional[str] = None) -> tp.Generator[str, None, None]:
+    """
+    Lazy version of str.split
+    :param text: string to split
+    :param separator: string to separate by, runs of whitespaces if None
+    """
+    if separator == '':
+        raise ValueError('empty separator')
+    pos = 0
+    for match in separator_pattern(separator).finditer(text):
+        if separator is not None or match.start() > pos:
+            yield text[pos:match.start()]
+        pos = match.end()
+    if separator is not None or pos < len(text):
+        yield text[pos:]
+
+
+def split_many(texts: tp.Iterable[str], separator: tp.Optional[str] = None) -> list[list[str]]:
+    """
+    Split many strings at once with str.split, much faster than itersplit
+    but all the parts are kept in memory
+    :param texts: strings to split
+    :param separator: string to separate by, runs of whitespaces if None
+    """
+    return [text.split(separator) for text in texts]
@@ -0,0 +1,144 @@
+"""
+Benchmark of the VM on test cases corpus, prints instructions per second and dispatches
+with and without superinstructions for every case and in total.
+Call-heavy cases are added to the corpus, they are prefixed with "calls_".
+Only cases the VM passes are measured, i.e. ones with the same output and exception as in CPython,
+results with superinstructions are checked to be the same as without them.
+Run from repository root:
+    python -m vm.benchmark --repeat 20 --filter loop
+"""
+import argparse
+import io
+import re
+import time
+import types
+import typing as tp
+
+from . import cases, vm, vm_runner
+
+
+CALL_CASES = [
+    cases.Case(
+        name="calls_recursion",
+        text_code=r"""
+def fib(n):
+    result = n
+    if n >= 2:
+        result = fib(n - 1) + fib(n - 2)
+    return result
+print(fib(15))
+"""),
+    cases.Case(
+        name="calls_positional_with_defaults",
+        text_code=r"""
+def add(a, b, c=1, d=2):
+    return a + b + c + d
+total = 0
+for i in range(2000):
+    total = add(total, i) + add(i, i, 3)
+print(total)
+"""),
+    cases.Case(
+        name="calls_keywords",
+        text_code=r"""
+def scale(x, *args, factor=2, **kwargs):
+    return x * factor + len(args) + len(kwargs)
+total = 0
+for i in range(2000):
+    total = total + scale(i, factor=3) + scale(i, 1, 2, key=i)
+print(total)
+"""),
+]
+
+
+class UnfusedFrame(vm.Frame):
+    superinstructions = ()
+
+
+def passes(code: types.CodeType) -> bool:
+    """
+    Check the VM runs code as CPython does, see test_public.py
+    :param code: compiled case
+    """
+    globals_context: dict[str, tp.Any] = {}
+    vm_out, _, vm_exc = vm_runner.execute(code, vm.VirtualMachine().run)
+    py_out, _, py_exc = vm_runner.execute(code, eval, globals_context, globals_context)
+    return vm_out == py_out and vm_exc == py_exc
+
+
+def same_as_unfused(code: types.CodeType) -> bool:
+    """
+    Check the VM with superinstructions runs code as the one without them
+    :param code: compiled case
+    """
+    vm_out, _, vm_exc = vm_runner.execute(code, vm.VirtualMachine().run)
+    unfused_out, _, unfused_exc = vm_runner.execute(code, vm.VirtualMachine(UnfusedFrame).run)
+    return vm_out == unfused_out and vm_exc == unfused_exc
+
+
+def measure(code: types.CodeType, frame_class: type[vm.Frame], repeat: int) -> tuple[int, float]:
+    """
+    :param code: compiled case
+    :param frame_class: frame class to run code with
+    :param repeat: number of runs
+    :return: dispatches and seconds of all runs
+    """
+    dispatches = vm.Frame.dispatches
+    start = time.perf_counter()
+    for _ in range(repeat):
+        vm_runner.execute(code, vm.VirtualMachine(frame_class).run)
+    seconds = time.perf_counter() - start
+    return vm.Frame.dispatches - dispatches, seconds
+
+
+def report(name: str, instructions: int, totals: dict[str, tuple[int, float]], repeat: int) -> None:
+    """
+    :param name: case name
+    :param instructions: number of executed instructions in all runs
+    :param totals: frame class name -> dispatches and seconds of all runs
+    :param repeat: number of runs
+    """
+    print(f'{name:<40}{instructions // repeat:>8} instructions', end='')
+    for frame_name, (dispatches, seconds) in totals.items():
+        print(f'{frame_name:>14}: {dispatches // repeat:>6} dispatches {instructions / seconds / 1e6:>6.2f} M/sec',
+              end='')
+    print()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=10, help='number of runs of every case')
+    parser.add_argument('--filter', default='', help='regex, benchmark only cases matching it')
+    parser.add_argument('--verbose', action='store_true', help='print every case')
+    args = parser.parse_args()
+
+    frame_classes = {'unfused': UnfusedFrame, 'fused': vm.Frame}
+    total_instructions, skipped, mismatched = 0, 0, []
+    totals = {name: (0, 0.) for name in frame_classes}
+    for case in [*cases.TEST_CASES, *CALL_CASES]:
+        if not re.search(args.filter, case.name):
+            continue
+        code = vm_runner.compile_code(case.text_code)
+        # Tracebacks of cases raising exceptions are printed to stderr by vm_runner.execute
+        with vm_runner.redirected(io.StringIO(), io.StringIO()):
+            if not same_as_unfused(code):
+                mismatched.append(case.name)
+            if not passes(code):
+                skipped += 1
+                continue
+            case_totals = {name: measure(code, frame_class, args.repeat) for name, frame_class in frame_classes.items()}
+        # Every instruction is dispatched separately without superinstructions
+        instructions = case_totals['unfused'][0]
+        total_instructions += instructions
+        for name, (dispatches, seconds) in case_totals.items():
+            totals[name] = (totals[name][0] + dispatches, totals[name][1] + seconds)
+        if args.verbose:
+            report(case.name, instructions, case_totals, args.repeat)
+    report('total', total_instructions, totals, args.repeat)
+    print(f'{skipped} cases the VM fails are skipped')
+    if mismatched:
+        print(f'Results with superinstructions differ in cases: {", ".join(mismatched)}')
+
+
+if __name__ == "__main__":
+    main()
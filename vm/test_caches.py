@@ -0,0 +1,46 @@
+import gc
+
+from . import vm
+from . import vm_runner
+
+
+def _run(text_code: str) -> str:
+    out, _, exc = vm_runner.execute(vm_runner.compile_code(text_code), vm.VirtualMachine().run)
+    assert exc is None
+    return out
+
+
+def test_name_cache_invalidation() -> None:
+    # Cached global is reloaded after it's stored again, in the same run and in the next run of the same code
+    code = vm_runner.compile_code(r"""
+scale = 2
+def scaled(x):
+    return x * scale
+total = 0
+for i in range(4):
+    total = total + scaled(i)
+    scale = scale + 1
+print(total)
+""")
+    for _ in range(2):
+        out, _, exc = vm_runner.execute(code, vm.VirtualMachine().run)
+        assert exc is None and out == '26\n'
+
+    assert _run('len = 5\nprint(len)\n') == '5\n'
+    assert _run('print(len)\n') == f'{len}\n'
+
+
+def test_name_cache_releases_namespaces() -> None:
+    # Cached function refers to globals of the run which refer to the code, so caches must not keep them alive
+    code = vm_runner.compile_code(r"""
+__cache_marker__ = 1
+def marker():
+    return __cache_marker__
+print(marker())
+""")
+    for _ in range(5):
+        out, _, exc = vm_runner.execute(code, vm.VirtualMachine().run)
+        assert exc is None and out == '1\n'
+
+    gc.collect()
+    assert not [obj for obj in gc.get_objects() if type(obj) is dict and '__cache_marker__' in obj]
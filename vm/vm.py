@@ -7,6 +7,222 @@ import builtins
 import dis
 import types
 import typing as tp
+import weakref
+from collections import defaultdict
+
+
+Handler = tp.Callable[['Frame', tp.Any], None]
+
+
+class Program:
+    """
+    Instructions of code object prepared to run by frames of a class: handlers from class dispatch table,
+    their arguments, offsets after them, flags of instructions after which next one is found by offset
+    and offset -> index table for O(1) jumps.
+    Sequences of instructions listed in `superinstructions` of the class are fused into one superinstruction
+    unless some of them but the first is a jump target. Its argument is a tuple of instructions arguments.
+    Arguments of instructions listed in `inline_caches` of the class are wrapped into caches, one per instruction.
+    Instructions listed in `local_index_opcodes` of the class get index of the local instead of its name
+    """
+    def __init__(self, instructions: tuple[dis.Instruction, ...], frame_class: type['Frame']) -> None:
+        table = frame_class.dispatch_table()
+        patterns = sorted(frame_class.superinstructions, key=len, reverse=True)
+        caches = frame_class.inline_caches
+        indexed = frame_class.local_index_opcodes
+        handlers: list[Handler] = []
+        args: list[tp.Any] = []
+        ends: list[int] = []
+        jumps: list[bool] = []
+        self.index: dict[int, int] = {}
+        i = 0
+        while i < len(instructions):
+            fused = [instructions[i]]
+            for pattern in patterns:
+                window = instructions[i: i + len(pattern)]
+                if tuple(instruction.opname for instruction in window) == pattern \
+                        and not any(instruction.is_jump_target for instruction in window[1:]):
+                    fused = list(window)
+                    break
+            self.index[fused[0].offset] = len(handlers)
+            handlers.append(table["__".join(instruction.opname for instruction in fused)])
+            fused_args = [caches[instruction.opname](instruction.argval) if instruction.opname in caches
+                          else instruction.arg if instruction.opname in indexed
+                          else instruction.argval for instruction in fused]
+            args.append(fused_args[0] if len(fused) == 1 else tuple(fused_args))
+            ends.append(fused[-1].offset + 2)
+            jumps.append(any("jump" in instruction.opname.lower() for instruction in fused))
+            i += len(fused)
+        self.handlers = tuple(handlers)
+        self.args = tuple(args)
+        self.ends = tuple(ends)
+        self.jumps = tuple(jumps)
+
+
+class DecodedCode:
+    """
+    Instructions of code object decoded once and programs made of them for frame classes
+    """
+    def __init__(self, code: types.CodeType) -> None:
+        self.instructions = tuple(dis.get_instructions(code))
+        self._programs: dict[type['Frame'], Program] = {}
+
+    def program(self, frame_class: type['Frame']) -> Program:
+        """
+        Program of the code for frame class, made once per class
+        :param frame_class: Frame or its subclass
+        """
+        program = self._programs.get(frame_class)
+        if program is None:
+            program = self._programs[frame_class] = Program(self.instructions, frame_class)
+        return program
+
+
+# Name -> number of stores and deletions of the name in any namespace, invalidates NameCache
+_name_versions: defaultdict[str, int] = defaultdict(int)
+# Caches filled since the last VirtualMachine.run finished, see NameCache
+_filled_name_caches: list['NameCache'] = []
+
+
+class NameCache:
+    """
+    Inline cache of LOAD_NAME / LOAD_GLOBAL instruction: value of the name found in the namespaces.
+    It's valid while frame namespaces are the same dicts and the name wasn't stored or deleted since then.
+    Builtins are supposed to be changed only by name operations of the VM.
+    Caches live as long as the code object, and the cached value (e.g. a function) refers to globals
+    of the run which refer to the code back, so caches are reset when VirtualMachine.run finishes
+    to let namespaces and code of the run be collected
+    """
+    __slots__ = ('name', 'locals', 'globals', 'builtins', 'version', 'value')
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.locals: tp.Optional[dict[str, tp.Any]] = None
+        self.globals: tp.Optional[dict[str, tp.Any]] = None
+        self.builtins: tp.Optional[dict[str, tp.Any]] = None
+        self.version = -1
+        self.value: tp.Any = None
+
+    def fill(self, value: tp.Any, locals: tp.Optional[dict[str, tp.Any]], globals: dict[str, tp.Any],
+             builtins: dict[str, tp.Any]) -> None:
+        if self.globals is None:
+            _filled_name_caches.append(self)
+        self.value = value
+        self.locals, self.globals, self.builtins = locals, globals, builtins
+        self.version = _name_versions[self.name]
+
+    def reset(self) -> None:
+        self.locals = self.globals = self.builtins = self.value = None
+        self.version = -1
+
+    def __repr__(self) -> str:
+        return f'NameCache({self.name!r})'
+
+
+class _Unbound:
+    """Marker of a fast local which is not bound"""
+    def __repr__(self) -> str:
+        return '<unbound>'
+
+
+_UNBOUND = _Unbound()
+
+
+class BindingPlan:
+    """
+    How call arguments are bound to fast locals of function frame, made once per function.
+    Plain positional calls are bound by concatenation, other ones are parsed by parameter names
+    """
+    def __init__(self, code: types.CodeType, defaults: tuple[tp.Any, ...], kw_defaults: dict[str, tp.Any]) -> None:
+        """
+        :param code: code of the function
+        :param defaults: default values of the last positional parameters
+        :param kw_defaults: default values of keyword-only parameters
+        """
+        posonlyargcount = code.co_posonlyargcount
+        kwonlyargcount = code.co_kwonlyargcount
+        argcount = code.co_argcount
+        self.varnames = code.co_varnames
+        self.pos_args = code.co_varnames[0: posonlyargcount]
+        self.usual_args = code.co_varnames[posonlyargcount: argcount]
+        self.kw_args = code.co_varnames[argcount: argcount + kwonlyargcount]
+        self.default_args = dict(zip(reversed(self.pos_args + self.usual_args), reversed(defaults)))
+        self.kw_defaults = kw_defaults
+        self.is_args = 4 == 4 & code.co_flags
+        self.is_kwargs = 8 == 8 & code.co_flags
+        args_ind = kwonlyargcount + argcount
+        self.args_name = code.co_varnames[args_ind] if self.is_args else None
+        self.kwargs_name = code.co_varnames[args_ind + self.is_args] if self.is_kwargs else None
+
+        self.positional = not kwonlyargcount and not self.is_args and not self.is_kwargs
+        self.argcount = argcount
+        self.min_argcount = argcount - len(defaults)
+        self.defaults = list(defaults)
+        self.unbound = [_UNBOUND] * (code.co_nlocals - argcount)
+
+    def bind(self, args: tuple[tp.Any, ...], kwargs: dict[str, tp.Any]) -> list[tp.Any]:
+        """
+        :param args: positional arguments of the call
+        :param kwargs: keyword arguments of the call
+        :return: fast locals of the frame, indexed as co_varnames
+        """
+        if not kwargs and self.positional and self.min_argcount <= len(args) <= self.argcount:
+            return [*args, *self.defaults[len(args) - self.min_argcount:], *self.unbound]
+
+        parsed_args: tp.Dict[str, tp.Any] = {}
+        args_list = list(args)
+        for arg in self.pos_args:
+            if len(args_list):
+                parsed_args[arg] = args_list.pop(0)
+            else:
+                parsed_args[arg] = self.default_args[arg]
+
+        for arg in self.usual_args:
+            if len(args_list):
+                parsed_args[arg] = args_list.pop(0)
+            elif arg in kwargs.keys():
+                parsed_args[arg] = kwargs[arg]
+                del kwargs[arg]
+            else:
+                parsed_args[arg] = self.default_args[arg]
+
+        if self.args_name is not None and self.args_name not in parsed_args.keys():
+            parsed_args[self.args_name] = tuple(args_list)
+        for arg in self.kw_args:
+            if arg not in kwargs.keys():
+                parsed_args[arg] = self.kw_defaults[arg]
+                continue
+            parsed_args[arg] = kwargs[arg]
+            del kwargs[arg]
+
+        if self.kwargs_name is not None and self.kwargs_name not in parsed_args.keys():
+            parsed_args[self.kwargs_name] = kwargs
+
+        return [parsed_args.get(name, _UNBOUND) for name in self.varnames]
+
+
+_decoded_codes: 'weakref.WeakKeyDictionary[types.CodeType, DecodedCode]' = weakref.WeakKeyDictionary()
+
+
+def decode(code: types.CodeType) -> DecodedCode:
+    """
+    Decoded code cached by code object
+    :param code: code to decode
+    """
+    decoded = _decoded_codes.get(code)
+    if decoded is None:
+        decoded = _decoded_codes[code] = DecodedCode(code)
+    return decoded
+
+
+def unimplemented(opname: str) -> Handler:
+    """
+    Handler of opcode without `<opname>_op` method, raises AttributeError as missing method lookup did
+    :param opname: name of opcode
+    """
+    def handler(frame: 'Frame', arg: tp.Any) -> None:
+        raise AttributeError(f"{type(frame).__name__} doesn't implement opcode {opname}")
+    handler.__name__ = opname.lower() + "_op"
+    return handler
 
 
 class Frame:
@@ -17,16 +233,43 @@ class Frame:
     Text description of frame parameters
         https://docs.python.org/3/library/inspect.html?highlight=frame#types-and-members
     """
+    # Number of dispatched instructions in all frames, see benchmark.py
+    dispatches = 0
+    # Sequences of opcodes fused into superinstructions, each is handled by `<opname>__<opname>..._op` method.
+    # Only the last instruction of a sequence may jump. Set to () to run instructions one by one
+    superinstructions: tuple[tuple[str, ...], ...] = (
+        ("LOAD_FAST", "LOAD_CONST"),
+        ("LOAD_FAST", "LOAD_CONST", "BINARY_ADD", "STORE_FAST"),
+        ("LOAD_FAST", "LOAD_CONST", "INPLACE_ADD", "STORE_FAST"),
+        ("LOAD_NAME", "LOAD_CONST"),
+        ("LOAD_CONST", "RETURN_VALUE"),
+        ("CALL_FUNCTION", "POP_TOP"),
+        ("COMPARE_OP", "POP_JUMP_IF_FALSE"),
+        ("COMPARE_OP", "POP_JUMP_IF_TRUE"),
+        ("LOAD_CONST", "COMPARE_OP", "POP_JUMP_IF_FALSE"),
+    )
+    # Opcode -> type of inline cache made of instruction argument and passed to the handler instead of it
+    inline_caches: dict[str, tp.Callable[[tp.Any], tp.Any]] = {
+        "LOAD_NAME": NameCache,
+        "LOAD_GLOBAL": NameCache,
+    }
+    # Opcodes whose handlers get index of fast local in co_varnames instead of its name
+    local_index_opcodes: frozenset[str] = frozenset({"LOAD_FAST", "STORE_FAST", "DELETE_FAST"})
+
     def __init__(self,
                  frame_code: types.CodeType,
                  frame_builtins: dict[str, tp.Any],
                  frame_globals: dict[str, tp.Any],
-                 frame_locals: dict[str, tp.Any]) -> None:
+                 frame_locals: dict[str, tp.Any],
+                 fast_locals: tp.Optional[list[tp.Any]] = None,
+                 program: tp.Optional[Program] = None) -> None:
         self.offset = 0
         self.code = frame_code
+        self.program = program
         self.builtins = frame_builtins
         self.globals = frame_globals
         self.locals = frame_locals
+        self.fast_locals = [_UNBOUND] * frame_code.co_nlocals if fast_locals is None else fast_locals
         self.data_stack: tp.Any = []
         self.return_value = None
 
@@ -51,21 +294,40 @@ class Frame:
         else:
             return []
 
+    @classmethod
+    def dispatch_table(cls) -> dict[str, Handler]:
+        """
+        Opcode name -> `<opname>_op` method of the class, built once per class.
+        Superinstructions are keyed by names of opcodes joined with "__".
+        Opcodes without method are dispatched to handler raising AttributeError
+        """
+        table = cls.__dict__.get("_dispatch_table")
+        if table is None:
+            opnames = [*dis.opmap, *("__".join(pattern) for pattern in cls.superinstructions)]
+            table = {opname: getattr(cls, opname.lower() + "_op", None) or unimplemented(opname)
+                     for opname in opnames}
+            setattr(cls, "_dispatch_table", table)
+        return table
+
     def run(self) -> tp.Any:
-        instructions = list(dis.get_instructions(self.code))
+        program = self.program or decode(self.code).program(type(self))
+        handlers, args, ends, jumps, index = program.handlers, program.args, program.ends, program.jumps, program.index
         i = 0
-        while i < len(instructions):
-            instruction = instructions[i]
-            self.offset += 2
-            getattr(self, instruction.opname.lower() + "_op")(instruction.argval)
-
-            if self.offset != instruction.offset + 2 or "jump" in instruction.opname.lower():
-                for ins in instructions:
-                    if ins.offset == self.offset:
-                        i = instructions.index(ins)
-                        break
-            else:
-                i += 1
+        n = len(handlers)
+        dispatches = 0
+        try:
+            while i < n:
+                end = ends[i]
+                self.offset = end
+                dispatches += 1
+                handlers[i](self, args[i])
+
+                if self.offset != end or jumps[i]:
+                    i = index.get(self.offset, i)
+                else:
+                    i += 1
+        finally:
+            Frame.dispatches += dispatches
 
         return self.return_value
 
@@ -81,7 +343,7 @@ class Frame:
         f = self.pop()
         self.push(f(*arguments))
 
-    def load_name_op(self, arg: str) -> None:
+    def load_name_op(self, cache: NameCache) -> None:
         """
         Partial realization
 
@@ -92,16 +354,21 @@ class Frame:
             https://github.com/python/cpython/blob/3.10/Python/ceval.c#L2829
         """
         # TODO: parse all scopes
-        if arg in self.locals:
-            self.push(self.locals[arg])
-        elif arg in self.builtins:
-            self.push(self.builtins[arg])
-        elif arg in self.globals:
-            self.push(self.globals[arg])
-        else:
-            raise NameError
+        arg = cache.name
+        if cache.locals is not self.locals or cache.globals is not self.globals \
+                or cache.builtins is not self.builtins or cache.version != _name_versions[arg]:
+            if arg in self.locals:
+                value = self.locals[arg]
+            elif arg in self.builtins:
+                value = self.builtins[arg]
+            elif arg in self.globals:
+                value = self.globals[arg]
+            else:
+                raise NameError
+            cache.fill(value, self.locals, self.globals, self.builtins)
+        self.data_stack.append(cache.value)
 
-    def load_global_op(self, arg: str) -> None:
+    def load_global_op(self, cache: NameCache) -> None:
         """
         Operation description:
             https://docs.python.org/release/3.10.6/library/dis.html#opcode-LOAD_GLOBAL
@@ -110,12 +377,17 @@ class Frame:
             https://github.com/python/cpython/blob/3.10/Python/ceval.c#L2958
         """
         # TODO: parse all scopes
-        if arg in self.globals:
-            self.push(self.globals[arg])
-        elif arg in self.builtins:
-            self.push(self.builtins[arg])
-        else:
-            raise NameError
+        arg = cache.name
+        if cache.globals is not self.globals or cache.builtins is not self.builtins \
+                or cache.version != _name_versions[arg]:
+            if arg in self.globals:
+                value = self.globals[arg]
+            elif arg in self.builtins:
+                value = self.builtins[arg]
+            else:
+                raise NameError
+            cache.fill(value, None, self.globals, self.builtins)
+        self.data_stack.append(cache.value)
 
     def load_const_op(self, arg: tp.Any) -> None:
         """
@@ -164,60 +436,15 @@ class Frame:
         self.pop()
         code = self.pop()
 
-        posonlyargcount = code.co_posonlyargcount
-        kwonlyargcount = code.co_kwonlyargcount
-        argcount = code.co_argcount
-        is_args = 4 == 4 & code.co_flags
-        is_kwargs = 8 == 8 & code.co_flags
         kw_only_dict = self.pop() if 0x02 == arg & 0x02 else {}
         pos_only_tuple = self.pop() if 0x01 == arg & 0x01 else ()
+        plan = BindingPlan(code, pos_only_tuple, kw_only_dict)
+        frame_class, frame_builtins, frame_globals = type(self), self.builtins, self.globals
+        program = decode(code).program(frame_class)
 
         def f(*args: tp.Any, **kwargs: tp.Any) -> tp.Any:
-            # TODO: parse input arguments using code attributes such as co_argcount
-            pos_args = code.co_varnames[0: posonlyargcount]
-            usual_args = code.co_varnames[posonlyargcount: argcount]
-            kw_args = code.co_varnames[argcount: argcount + kwonlyargcount]
-            default_args = dict(zip(reversed(pos_args + usual_args), reversed(pos_only_tuple)))
-
-            parsed_args: tp.Dict[str, tp.Any] = {}
-            args_ind = kwonlyargcount + argcount
-            args_list = list(args)
-            for arg in pos_args:
-                if len(args_list):
-                    parsed_args[arg] = args_list.pop(0)
-                else:
-                    parsed_args[arg] = default_args[arg]
-
-            for arg in usual_args:
-                if len(args_list):
-                    parsed_args[arg] = args_list.pop(0)
-                elif arg in kwargs.keys():
-                    parsed_args[arg] = kwargs[arg]
-                    del kwargs[arg]
-                else:
-                    parsed_args[arg] = default_args[arg]
-
-            if is_args:
-                var = code.co_varnames[args_ind]
-                if var not in parsed_args.keys():
-                    parsed_args[var] = tuple(args_list)
-            for arg in kw_args:
-                if arg not in kwargs.keys():
-                    parsed_args[arg] = kw_only_dict[arg]
-                    continue
-                parsed_args[arg] = kwargs[arg]
-                del kwargs[arg]
-
-            if is_kwargs:
-                kwargs_name = code.co_varnames[args_ind + 1] if is_args else code.co_varnames[args_ind]
-                if kwargs_name not in parsed_args.keys():
-                    parsed_args[kwargs_name] = kwargs
-
-            f_locals = dict(self.locals)
-            f_locals.update(parsed_args)
-
-            frame = Frame(code, self.builtins, self.globals, f_locals)  # Run code in prepared environment
-            return frame.run()
+            # Run code in prepared environment
+            return frame_class(code, frame_builtins, frame_globals, {}, plan.bind(args, kwargs), program).run()
 
         self.push(f)
 
@@ -231,6 +458,7 @@ class Frame:
         """
         const = self.pop()
         self.locals[arg] = const
+        _name_versions[arg] += 1
 
     def store_subscr_op(self, arg: str) -> None:
         tos2, tos1, tos0 = self.popn(3)
@@ -240,15 +468,16 @@ class Frame:
     def store_global_op(self, arg: str) -> None:
         const = self.pop()
         self.globals[arg] = const
+        _name_versions[arg] += 1
 
-    def load_fast_op(self, arg: str) -> None:
-        if arg in self.locals:
-            self.push(self.locals[arg])
-        else:
+    def load_fast_op(self, index: int) -> None:
+        value = self.fast_locals[index]
+        if value is _UNBOUND:
             raise UnboundLocalError("")
+        self.data_stack.append(value)
 
-    def store_fast_op(self, arg: str) -> None:
-        self.locals[arg] = self.pop()
+    def store_fast_op(self, index: int) -> None:
+        self.fast_locals[index] = self.data_stack.pop()
 
     def extended_arg_op(self, count: int) -> None:
         res = 0
@@ -407,6 +636,18 @@ class Frame:
         arr = self.popn(2 * cnt)
         self.push(dict(zip(arr[::2], arr[1::2])))
 
+    def load_attr_op(self, name: str) -> None:
+        """
+        Operation description:
+            https://docs.python.org/release/3.10.6/library/dis.html#opcode-LOAD_ATTR
+
+        Operation realization:
+            https://github.com/python/cpython/blob/3.10/Python/ceval.c
+
+        No inline cache: getattr is a single call using type attribute cache of cpython
+        """
+        self.data_stack.append(getattr(self.data_stack.pop(), name))
+
     def load_method_op(self, val: str) -> None:
         obj = self.pop()
         obj_dict = obj.__class__.__dict__
@@ -422,9 +663,12 @@ class Frame:
 
     def delete_name_op(self, val: str) -> None:
         del self.locals[val]
+        _name_versions[val] += 1
 
-    def delete_fast_op(self, val: str) -> None:
-        del self.locals[val]
+    def delete_fast_op(self, index: int) -> None:
+        if self.fast_locals[index] is _UNBOUND:
+            raise UnboundLocalError("")
+        self.fast_locals[index] = _UNBOUND
 
     def build_string_op(self, cnt: int) -> None:
         self.push("".join(self.popn(cnt)))
@@ -524,12 +768,75 @@ class Frame:
     def unary_positive_op(self, _: tp.Any) -> None:
         self.push(self.pop())
 
+    # Superinstructions, see Frame.superinstructions
+
+    def load_fast__load_const_op(self, args: tuple[int, tp.Any]) -> None:
+        index, const = args
+        self.load_fast_op(index)
+        self.data_stack.append(const)
+
+    def load_fast__load_const__binary_add__store_fast_op(self, args: tuple[int, tp.Any, None, int]) -> None:
+        index, const, _, target = args
+        value = self.fast_locals[index]
+        if value is _UNBOUND:
+            raise UnboundLocalError("")
+        self.fast_locals[target] = value + const
+
+    def load_fast__load_const__inplace_add__store_fast_op(self, args: tuple[int, tp.Any, None, int]) -> None:
+        index, const, _, target = args
+        value = self.fast_locals[index]
+        if value is _UNBOUND:
+            raise UnboundLocalError("")
+        self.fast_locals[target] = value + const
+
+    def load_name__load_const_op(self, args: tuple[NameCache, tp.Any]) -> None:
+        name, const = args
+        self.load_name_op(name)
+        self.data_stack.append(const)
+
+    def load_const__return_value_op(self, args: tuple[tp.Any, None]) -> None:
+        self.return_value = args[0]
+
+    def call_function__pop_top_op(self, args: tuple[int, None]) -> None:
+        self.call_function_op(args[0])
+        self.data_stack.pop()
+
+    def compare_op__pop_jump_if_false_op(self, args: tuple[str, int]) -> None:
+        op, target = args
+        val1 = self.data_stack.pop()
+        val2 = self.data_stack.pop()
+        if not self.compare_operations(op, val2, val1):
+            self.offset = target
+
+    def compare_op__pop_jump_if_true_op(self, args: tuple[str, int]) -> None:
+        op, target = args
+        val1 = self.data_stack.pop()
+        val2 = self.data_stack.pop()
+        if self.compare_operations(op, val2, val1):
+            self.offset = target
+
+    def load_const__compare_op__pop_jump_if_false_op(self, args: tuple[tp.Any, str, int]) -> None:
+        const, op, target = args
+        if not self.compare_operations(op, self.data_stack.pop(), const):
+            self.offset = target
+
 
 class VirtualMachine:
+    def __init__(self, frame_class: type[Frame] = Frame) -> None:
+        """
+        :param frame_class: Frame or its subclass, e.g. one without superinstructions
+        """
+        self.frame_class = frame_class
+
     def run(self, code_obj: types.CodeType) -> None:
         """
         :param code_obj: code for interpreting
         """
         globals_context: dict[str, tp.Any] = {}
-        frame = Frame(code_obj, builtins.globals()['__builtins__'], globals_context, globals_context)
-        return frame.run()
+        frame = self.frame_class(code_obj, builtins.globals()['__builtins__'], globals_context, globals_context)
+        try:
+            return frame.run()
+        finally:
+            for cache in _filled_name_caches:
+                cache.reset()
+            _filled_name_caches.clear()